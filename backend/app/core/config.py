@@ -50,6 +50,7 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
     FILE_TOKEN_EXPIRE_MINUTES: int = 5
+    BCRYPT_ROUNDS: int = 12  # tune so one hash takes 150–600 ms on the deploy host (warned at startup)
 
     # ── Cookie Settings ───────────────────────────────────
     COOKIE_SECURE: bool = False
@@ -92,11 +92,22 @@ async def lifespan(app: FastAPI):
     except Exception as exc:
         logger.warning("Reranker preload failed (non-fatal, will load on first use): %s", exc)
 
+    # 2b. Measure password hashing cost on this host (logs if out of band)
+    try:
+        from app.services.auth.security import check_password_hash_cost
+        await asyncio.to_thread(check_password_hash_cost)
+    except Exception as exc:
+        logger.warning("Password hash cost check failed (non-fatal): %s", exc)
+
     # 3. Start the background document processing worker
     from app.services.worker import job_processor
     _job_processor_task = asyncio.create_task(job_processor(), name="job_processor")
     logger.info("Background job processor task created.")
 
+    # 3b. Start the batched API usage audit writer
+    from app.services.audit_logger import start_audit_flusher
+    start_audit_flusher()
+
     # 4. Ensure sandbox packages are installed
     try:
         from app.services.code_execution.sandbox_env import ensure_packages
@@ -135,6 +146,10 @@ async def lifespan(app: FastAPI):
             pass
         logger.info("Background job processor stopped.")
 
+    # Flush queued audit rows while the DB is still connected
+    from app.services.audit_logger import stop_audit_flusher
+    await stop_audit_flusher()
+
     await disconnect_db()
 
 
@@ -102,6 +102,7 @@ async def chat_endpoint(
             if existing and (not existing.title or existing.title in ("", "New Chat")):
                 new_title = request.message[:30] + ("..." if len(request.message) > 30 else "")
                 await prisma.chatsession.update(where={"id": session_id}, data={"title": new_title})
+                chat_service.invalidate_chat_cache(str(current_user.id), request.notebook_id)
         except Exception:
             pass  # non-critical — don't fail the chat request
 
@@ -201,7 +202,9 @@ async def chat_endpoint(
                             agent_meta=agent_meta if agent_meta else None,
                         )
                         if msg_id:
-                            blocks = await chat_service.save_response_blocks(msg_id, complete_answer)
+                            blocks = await chat_service.save_response_blocks(
+                                msg_id, complete_answer, str(current_user.id), request.notebook_id,
+                            )
                             if blocks:
                                 blocks_data = json.dumps({"blocks": blocks})
                                 yield f"event: blocks\ndata: {blocks_data}\n\n"
@@ -279,7 +282,9 @@ async def chat_endpoint(
 
             blocks = []
             if msg_id:
-                blocks = await chat_service.save_response_blocks(msg_id, answer)
+                blocks = await chat_service.save_response_blocks(
+                    msg_id, answer, str(current_user.id), request.notebook_id,
+                )
 
             confidence = chat_service.compute_confidence_score("", answer)
 
@@ -375,6 +380,7 @@ async def block_followup(
                                     "text": f"[{request.action}] {full_response}",
                                 }
                             )
+                            chat_service.invalidate_chat_cache(str(current_user.id), str(notebook.id))
                     except Exception as persist_err:
                         logger.warning("Failed to persist block followup: %s", persist_err)
 
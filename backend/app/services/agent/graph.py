@@ -23,6 +23,11 @@ from app.services.agent.reflection import reflect, should_continue
 
 logger = logging.getLogger(__name__)
 
+# RAG answer deltas are coalesced into one SSE token frame per this many
+# deltas or this interval, whichever comes first.
+_TOKEN_BATCH_SIZE = 8
+_TOKEN_BATCH_SECONDS = 0.02
+
 
 # ── Combined Intent + Plan Node ───────────────────────────────
 
@@ -81,8 +86,8 @@ async def generate_response(state: AgentState) -> AgentState:
         stopped_reason = "no_completed_materials"
     else:
         # Collect successful results
-        successful = [r for r in tool_results if r.get("success")]
-        failed = [r for r in tool_results if not r.get("success")]
+        successful = [r for r in tool_results if r.success]
+        failed = [r for r in tool_results if not r.success]
 
         if not successful and failed:
             # All tools failed
@@ -93,8 +98,8 @@ async def generate_response(state: AgentState) -> AgentState:
             )
         elif successful:
             if len(successful) == 1:
-                raw_output = (successful[0].get("output") or "").strip()
-                tool_name = successful[0].get("tool_name", "")
+                raw_output = (successful[0].output or "").strip()
+                tool_name = successful[0].tool_name
                 # If the single output is a DATA_ANALYSIS JSON blob, extract
                 # the explanation and keep the structured data in metadata.
                 response = _format_tool_output(raw_output, tool_name, intent)
@@ -102,8 +107,8 @@ async def generate_response(state: AgentState) -> AgentState:
                 # Multi-tool synthesis: format each output individually
                 context_parts = []
                 for i, result in enumerate(successful):
-                    tool_name = result.get("tool_name", "unknown")
-                    raw_output = (result.get("output") or "").strip()
+                    tool_name = result.tool_name or "unknown"
+                    raw_output = (result.output or "").strip()
                     if not raw_output:
                         continue
                     formatted = _format_tool_output(raw_output, tool_name, intent)
@@ -120,11 +125,11 @@ async def generate_response(state: AgentState) -> AgentState:
     metadata = {
         "intent": str(intent or "UNKNOWN"),
         "confidence": float(state.get("intent_confidence") or 0.0),
-        "tools_used": [str(r.get("tool_name") or "unknown") for r in tool_results] if tool_results else [],
+        "tools_used": [str(r.tool_name or "unknown") for r in tool_results] if tool_results else [],
         "iterations": int(iterations or 0),
         "total_tokens": int(total_tokens or 0),
         "stopped_reason": stopped_reason,
-        "step_log": state.get("step_log", []),
+        "step_log": list(state.get("step_log", [])),
         "generated_files": state.get("generated_files", []),
         "repair_attempts": state.get("repair_attempts", 0),
     }
@@ -241,10 +246,11 @@ async def run_agent(
         elapsed = time.time() - start
 
         logger.info(
-            f"Agent completed in {elapsed:.2f}s | "
-            f"Intent: {result.get('intent')} | "
-            f"Tools: {result.get('total_tool_calls', 0)} | "
-            f"Tokens: {result.get('total_tokens', 0)}"
+            "Agent completed in %.2fs | Intent: %s | Tools: %s | Tokens: %s",
+            elapsed,
+            result.get("intent"),
+            result.get("total_tool_calls", 0),
+            result.get("total_tokens", 0),
         )
 
         return {
@@ -254,7 +260,7 @@ async def run_agent(
 
     except Exception as e:
         elapsed = time.time() - start
-        logger.error(f"Agent failed after {elapsed:.2f}s: {e}")
+        logger.error("Agent failed after %.2fs: %s", elapsed, e)
         return {
             "response": f"I'm sorry, an error occurred: {str(e)}",
             "agent_metadata": {
@@ -276,10 +282,12 @@ async def run_agent_stream(
     - event: start    data: {"session_id": "..."}
     - event: step     data: {"session_id": "...", "tool": "...", "status": "..."}
     - event: token    data: {"session_id": "...", "content": "..."}
-    - event: code_stdout data: {"session_id": "...", "line": "..."}
+    - event: code_stdout data: {"session_id": "...", "line": "..."}  (may hold several "\n"-joined lines)
     - event: meta     data: {"session_id": "...", "intent": "...", ...}
     - event: done     data: {"session_id": "...", "elapsed": S}
     """
+    from app.services.chat.service import RAG_ANSWER_TAG
+
     graph = get_agent_graph()
     start_time = time.time()
     session_id = state.get("session_id", "unknown")
@@ -289,12 +297,42 @@ async def run_agent_stream(
     _emitted_done = False
     _prev_step_count = 0
     _prev_repair_attempts = 0
-    _streamed_tokens = False  # Track if rag_token events already sent content
+    _last_stderr = ""  # from the latest tool_router output — reflection returns deltas only
+    _streamed_tokens = False  # Track if RAG answer tokens were already sent
     _step_running_tool = None  # Dedup guard: tracks which tool has an active "running" step
+    _token_batch: list[str] = []
+    _token_flushed_at = time.perf_counter()
+
+    def _token_frame() -> str:
+        nonlocal _token_flushed_at
+        token_data = json.dumps({"session_id": session_id, "content": "".join(_token_batch)})
+        _token_batch.clear()
+        _token_flushed_at = time.perf_counter()
+        return f"event: token\ndata: {token_data}\n\n"
+
     try:
         async for event in graph.astream_events(state, version="v2"):
             kind = event["event"]
 
+            # 0) RAG answer deltas — the tagged model run's own stream events.
+            # Other LLM calls (intent, planning, code generation) stream too
+            # but stay internal.
+            if kind in ("on_chat_model_stream", "on_llm_stream") and RAG_ANSWER_TAG in event.get("tags", ()):
+                chunk = event["data"].get("chunk")
+                content = getattr(chunk, "content", None) or getattr(chunk, "text", "")
+                if content:
+                    _token_batch.append(content)
+                    _streamed_tokens = True
+                    if (
+                        len(_token_batch) >= _TOKEN_BATCH_SIZE
+                        or time.perf_counter() - _token_flushed_at >= _TOKEN_BATCH_SECONDS
+                    ):
+                        yield _token_frame()
+                continue
+            if _token_batch:
+                # Any other event ends a run of deltas — send what's pending first
+                yield _token_frame()
+
             # 1) Chain start for tool_router — emit "step running" event
             if kind == "on_chain_start" and event.get("name") == "tool_router":
                 # Extract which tool is about to run from the plan
@@ -334,6 +372,7 @@ async def run_agent_stream(
                 if isinstance(output, dict):
                     step_log = output.get("step_log", [])
                     selected_tool = output.get("selected_tool", "unknown")
+                    _last_stderr = output.get("last_stderr", _last_stderr)
 
                     # Emit step_done
                     if len(step_log) > _prev_step_count:
@@ -358,27 +397,22 @@ async def run_agent_stream(
             elif kind == "on_chain_end" and event.get("name") == "reflection":
                 output = event["data"].get("output")
                 if isinstance(output, dict):
-                    current_repairs = output.get("repair_attempts", 0)
+                    # Nodes return only changed keys — a missing counter means unchanged
+                    current_repairs = output.get("repair_attempts", _prev_repair_attempts)
                     if current_repairs > _prev_repair_attempts:
-                        yield f"event: repair_attempt\ndata: {json.dumps({'session_id': session_id, 'attempt': current_repairs, 'error_summary': (output.get('last_stderr', '') or '')[:200]})}\n\n"
+                        yield f"event: repair_attempt\ndata: {json.dumps({'session_id': session_id, 'attempt': current_repairs, 'error_summary': (_last_stderr or '')[:200]})}\n\n"
                         _prev_repair_attempts = current_repairs
                     elif current_repairs == 0 and _prev_repair_attempts > 0:
                         yield f"event: repair_success\ndata: {json.dumps({'session_id': session_id, 'attempt': _prev_repair_attempts})}\n\n"
                         _prev_repair_attempts = 0
 
             # 2) Custom events from tools
-            # NOTE: we do NOT forward on_chat_model_stream here — the rag_token
-            # custom event already carries every LLM delta from inside the RAG
-            # tool, so forwarding both would double every token in the client.
             elif kind == "on_custom_event":
                 if event["name"] == "code_stdout":
-                    line = event["data"].get("line", "")
+                    data = event["data"]
+                    # python_tool batches lines; forward the batch as one frame
+                    line = "\n".join(data["lines"]) if "lines" in data else data.get("line", "")
                     yield f"event: code_stdout\ndata: {json.dumps({'session_id': session_id, 'line': line})}\n\n"
-                elif event["name"] == "rag_token":
-                    content = event["data"].get("content", "")
-                    token_data = json.dumps({"session_id": session_id, "content": content})
-                    yield f"event: token\ndata: {token_data}\n\n"
-                    _streamed_tokens = True
                 elif event["name"] == "code_generating":
                     # The LLM is generating code — tell the frontend
                     yield f"event: code_generating\ndata: {json.dumps({'session_id': session_id, 'status': 'generating'})}\n\n"
@@ -399,7 +433,7 @@ async def run_agent_stream(
                     # Emit the final response as token events in chunks so
                     # the frontend streams it progressively.
                     # Skip cases where content was already streamed:
-                    #   1. rag_token events — content sent live during RAG execution
+                    #   1. RAG answer tokens — content sent live during RAG execution
                     #   2. Structured JSON responses (DATA_ANALYSIS base64 payloads) —
                     #      these can be several hundred KB; emitting them as 80-char
                     #      chunks causes hundreds of re-renders of partial JSON in the
@@ -415,6 +449,8 @@ async def run_agent_stream(
 
                     yield f"event: meta\ndata: {json.dumps(metadata)}\n\n"
 
+        if _token_batch:
+            yield _token_frame()
         elapsed = time.time() - start_time
         yield f"event: done\ndata: {json.dumps({'session_id': session_id, 'elapsed': round(elapsed, 2)})}\n\n"
         _emitted_done = True
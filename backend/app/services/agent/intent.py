@@ -8,6 +8,7 @@ from __future__ import annotations
 
 import logging
 import re
+from enum import StrEnum
 from typing import Any, Dict, Tuple
 
 from app.services.agent.state import AgentState
@@ -16,12 +17,28 @@ from app.services.llm_service.llm import get_llm
 logger = logging.getLogger(__name__)
 
 # ── Intent Constants ──────────────────────────────────────────
-QUESTION = "QUESTION"
-DATA_ANALYSIS = "DATA_ANALYSIS"
-RESEARCH = "RESEARCH"
-CODE_EXECUTION = "CODE_EXECUTION"
-FILE_GENERATION = "FILE_GENERATION"
-CONTENT_GENERATION = "CONTENT_GENERATION"
+
+
+class Intent(StrEnum):
+    """Agent intents.
+
+    A ``StrEnum`` so members are singletons that still compare equal to, and
+    serialize as, the plain strings route handlers and the frontend use.
+    """
+    QUESTION = "QUESTION"
+    DATA_ANALYSIS = "DATA_ANALYSIS"
+    RESEARCH = "RESEARCH"
+    CODE_EXECUTION = "CODE_EXECUTION"
+    FILE_GENERATION = "FILE_GENERATION"
+    CONTENT_GENERATION = "CONTENT_GENERATION"
+
+
+QUESTION = Intent.QUESTION
+DATA_ANALYSIS = Intent.DATA_ANALYSIS
+RESEARCH = Intent.RESEARCH
+CODE_EXECUTION = Intent.CODE_EXECUTION
+FILE_GENERATION = Intent.FILE_GENERATION
+CONTENT_GENERATION = Intent.CONTENT_GENERATION
 
 # ── Intent Hierarchy — order matters, checked top to bottom ──
 
@@ -20,6 +20,14 @@ logger = logging.getLogger(__name__)
 # Structured file extensions — these must bypass RAG and be loaded directly.
 _STRUCTURED_EXTS = frozenset({".csv", ".xlsx", ".xls", ".tsv", ".ods"})
 
+# Step conditionals are compiled to integer opcodes once at plan time so the
+# router dispatches through a table instead of comparing strings every step.
+COND_IF_PREVIOUS_EMPTY = 1
+
+_COND_CODES: Dict[str, int] = {
+    "if_previous_empty": COND_IF_PREVIOUS_EMPTY,
+}
+
 
 def _get_structured_workspace_files(workspace_files: List[Dict]) -> List[Dict]:
     """Return only the structured data files (CSV / Excel / TSV / ODS) from workspace_files."""
@@ -110,6 +118,19 @@ def _resolve_file_generation_plan(message: str) -> List[Dict[str, Any]]:
     ]
 
 
+def _compile_conditions(plan: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Tag each conditional step with its ``_cond_code`` opcode for the router."""
+    for step in plan:
+        cond = step.get("conditional")
+        if cond is not None and "_cond_code" not in step:
+            code = _COND_CODES.get(cond)
+            if code is None:
+                logger.warning("[planner] Unknown step conditional %r — ignoring", cond)
+                continue
+            step["_cond_code"] = code
+    return plan
+
+
 def _check_edit_intent(message: str, generated_files: List[Dict]) -> bool:
     """Check if user wants to edit an existing generated file."""
     if not generated_files:
@@ -134,7 +155,11 @@ async def plan_execution(state: AgentState) -> AgentState:
             "[planner] Pre-set plan %s — skipping planning",
             [s["tool"] for s in state["plan"]],
         )
-        return {**state, "current_step": state.get("current_step", 0)}
+        return {
+            **state,
+            "plan": _compile_conditions(state["plan"]),
+            "current_step": state.get("current_step", 0),
+        }
 
     intent = state.get("intent", QUESTION)
     message = state.get("user_message", "")
@@ -243,6 +268,6 @@ async def plan_execution(state: AgentState) -> AgentState:
 
     return {
         **state,
-        "plan": plan,
+        "plan": _compile_conditions(plan),
         "current_step": 0,
     }
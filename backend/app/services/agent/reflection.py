@@ -17,6 +17,9 @@ Safety limits (from state.py):
     MAX_TOOL_CALLS       = 10   -- hard stop on total tool calls
     TOKEN_BUDGET         = 12000 -- hard stop on token consumption
 
+Like the router, reflection returns only the keys it changed and lets
+LangGraph merge them into the running state.
+
 Per-step retry budget:
     Up to 2 retries per individual plan step (tracked via step_retries).
     After 2 retries the step is abandoned and the agent proceeds.
@@ -25,8 +28,10 @@ Per-step retry budget:
 from __future__ import annotations
 
 import logging
+from operator import itemgetter
 
 from app.core.config import settings
+from app.services.agent.intent import QUESTION
 from app.services.agent.state import (
     AgentState,
     MAX_AGENT_ITERATIONS,
@@ -42,31 +47,136 @@ _MIN_USEFUL_OUTPUT_LEN = 50  # chars — below this, output is considered empty
 # Tools that support self-healing code repair
 _CODE_TOOLS = {"code_executor", "file_generator", "python_tool"}
 
+# Defaults for the fields reflect_sync reads; merged under state once so every
+# field comes back from a single C-level itemgetter call.
+_REFLECT_DEFAULTS = {
+    "iterations": 0,
+    "total_tool_calls": 0,
+    "total_tokens": 0,
+    "summary_state": None,
+    "plan": [],
+    "current_step": 0,
+    "step_retries": 0,
+    "intent": "UNKNOWN",
+    "selected_tool": "unknown",
+    "repair_attempts": 0,
+}
+_reflect_fields = itemgetter(*_REFLECT_DEFAULTS)
+
+
+def _needs_code_repair(state: AgentState) -> bool:
+    """Return True when reflection must take the async LLM repair path.
+
+    Mirrors the checks ``reflect_sync`` performs before reaching the repair
+    branch: safety limits not yet hit, last result is a failed code tool with
+    stderr available, and the repair budget is not exhausted.
+    """
+    summary = state.get("summary_state")
+    if not summary:
+        return False
+    if (
+        state.get("iterations", 0) + 1 >= MAX_AGENT_ITERATIONS
+        or state.get("total_tool_calls", 0) >= MAX_TOOL_CALLS
+        or state.get("total_tokens", 0) >= TOKEN_BUDGET
+    ):
+        return False
+    if summary["last_success"] or summary["last_tool"] not in _CODE_TOOLS:
+        return False
+    last_stderr = state.get("last_stderr", "") or summary["last_error"]
+    return bool(last_stderr) and state.get("repair_attempts", 0) < settings.MAX_CODE_REPAIR_ATTEMPTS
+
 
 async def reflect(state: AgentState) -> AgentState:
-    """Reflection node — checks tool output quality and enforces safety limits.
+    """Reflection node — dispatches to the sync fast path or the repair path.
+
+    Only a failed code tool with repair budget left needs to await the LLM;
+    every other decision is made synchronously by ``reflect_sync``.
+    """
+    if _needs_code_repair(state):
+        return await reflect_with_repair(state)
+    return reflect_sync(state)
+
+
+async def reflect_with_repair(state: AgentState) -> AgentState:
+    """Attempt LLM-based code repair, falling back to ``reflect_sync`` on failure."""
+    iterations = state.get("iterations", 0) + 1
+    tool_results = state.get("tool_results", [])
+    plan = state.get("plan") or []
+    current_step = state.get("current_step", 0)
+    step_retries = state.get("step_retries", 0)
+    repair_attempts = state.get("repair_attempts", 0)
+    last_result = tool_results[-1]
+    last_stderr = state.get("last_stderr", "") or last_result.get("error", "")
+
+    logger.info(
+        "[reflect] Code error detected — repair attempt %d/%d for tool=%s",
+        repair_attempts + 1,
+        settings.MAX_CODE_REPAIR_ATTEMPTS,
+        last_result.get("tool_name", "?"),
+    )
+    try:
+        from app.services.agent.tools.code_repair import repair_code
+        from app.services.llm_service.llm import get_llm
+
+        # Get broken code from step_log or tool metadata
+        step_log = state.get("step_log", [])
+        broken_code = ""
+        if step_log:
+            broken_code = step_log[-1].get("code", "")
+        if not broken_code:
+            broken_code = last_result.get("metadata", {}).get("code", "")
+
+        if broken_code:
+            llm = get_llm(temperature=0.0, max_tokens=4000)
+            fixed_code = await repair_code(broken_code, last_stderr, llm)
+
+            # Update the plan step's code with the fixed version
+            prev_step_idx = max(0, current_step - 1)
+            if prev_step_idx < len(plan):
+                plan = [*plan]
+                plan[prev_step_idx] = {**plan[prev_step_idx], "code": fixed_code}
+
+            return {
+                "iterations": iterations,
+                "plan": plan,
+                "repair_attempts": repair_attempts + 1,
+                "needs_retry": True,
+                "current_step": prev_step_idx,  # go back to re-execute
+                "step_retries": step_retries,
+            }
+    except Exception as exc:
+        logger.warning("[reflect] Code repair failed: %s", exc)
+
+    return reflect_sync(state)
+
+
+def reflect_sync(state: AgentState) -> AgentState:
+    """Synchronous reflection — checks tool output quality and enforces safety limits.
 
     Decision tree:
     1. Increment iteration counter.
     2. Enforce hard safety limits (iterations, tool calls, tokens).
-    3. Self-healing code repair: if last tool was code-related and failed,
-       attempt LLM-based repair up to MAX_CODE_REPAIR_ATTEMPTS.
+    3. Code repair exhausted for a failed code tool: stop retrying it.
+       (Repair attempts themselves run in ``reflect_with_repair``.)
     4. If last tool failed AND we have retries left: go back one step.
     5. If output is near-empty for QUESTION intent AND no research fallback
        was attempted yet: inject research_tool as dynamic fallback.
     6. If more plan steps remain: continue to next step.
     7. All steps done (or retries exhausted): proceed to response generation.
     """
-    iterations = state.get("iterations", 0) + 1
-    total_tool_calls = state.get("total_tool_calls", 0)
-    total_tokens = state.get("total_tokens", 0)
-    tool_results = state.get("tool_results", [])
-    plan = list(state.get("plan", []))
-    current_step = state.get("current_step", 0)
-    step_retries = state.get("step_retries", 0)
-    intent = state.get("intent", "UNKNOWN")
-    selected_tool = state.get("selected_tool", "unknown")
-    repair_attempts = state.get("repair_attempts", 0)
+    (
+        iterations,
+        total_tool_calls,
+        total_tokens,
+        summary,
+        plan,
+        current_step,
+        step_retries,
+        intent,
+        selected_tool,
+        repair_attempts,
+    ) = _reflect_fields({**_REFLECT_DEFAULTS, **state})
+    iterations += 1
 
     logger.info(
         "[reflect] iter=%d | tool=%s | intent=%s | steps=%d/%d | retries=%d | repairs=%d | tokens=%d",
@@ -83,80 +193,34 @@ async def reflect(state: AgentState) -> AgentState:
     # -- 1. Hard safety limits ---------------------------------------------------
     if iterations >= MAX_AGENT_ITERATIONS:
         logger.warning("[reflect] STOP: max iterations reached (%d)", MAX_AGENT_ITERATIONS)
-        return {**state, "iterations": iterations, "needs_retry": False,
+        return {"iterations": iterations, "needs_retry": False,
                 "stopped_reason": "max_iterations"}
 
     if total_tool_calls >= MAX_TOOL_CALLS:
         logger.warning("[reflect] STOP: max tool calls reached (%d)", MAX_TOOL_CALLS)
-        return {**state, "iterations": iterations, "needs_retry": False,
+        return {"iterations": iterations, "needs_retry": False,
                 "stopped_reason": "max_tool_calls"}
 
     if total_tokens >= TOKEN_BUDGET:
         logger.warning("[reflect] STOP: token budget exhausted (%d)", TOKEN_BUDGET)
-        return {**state, "iterations": iterations, "needs_retry": False,
+        return {"iterations": iterations, "needs_retry": False,
                 "stopped_reason": "token_budget"}
 
     # -- 2. Check last tool result quality ---------------------------------------
-    if tool_results:
-        last_result = tool_results[-1]
-        last_success = last_result.get("success", False)
-        last_output = (last_result.get("output") or "").strip()
-        last_tool = last_result.get("tool_name", "?")
+    if summary:
+        last_success = summary["last_success"]
+        last_output_chars = summary["last_output_chars"]
+        last_tool = summary["last_tool"]
 
-        # -- 2a. Self-healing code repair for code execution tools ------
+        # -- 2a. Code repair budget exhausted for a code execution tool ------
         if not last_success and last_tool in _CODE_TOOLS:
-            last_stderr = state.get("last_stderr", "") or last_result.get("error", "")
-            max_repairs = settings.MAX_CODE_REPAIR_ATTEMPTS
-
-            if last_stderr and repair_attempts < max_repairs:
-                # Attempt code repair via LLM
-                logger.info(
-                    "[reflect] Code error detected — repair attempt %d/%d for tool=%s",
-                    repair_attempts + 1,
-                    max_repairs,
-                    last_tool,
-                )
-                try:
-                    from app.services.agent.tools.code_repair import repair_code
-                    from app.services.llm_service.llm import get_llm
-
-                    # Get broken code from step_log or tool metadata
-                    step_log = state.get("step_log", [])
-                    broken_code = ""
-                    if step_log:
-                        broken_code = step_log[-1].get("code", "")
-                    if not broken_code:
-                        broken_code = last_result.get("metadata", {}).get("code", "")
-
-                    if broken_code:
-                        llm = get_llm(temperature=0.0, max_tokens=4000)
-                        fixed_code = await repair_code(broken_code, last_stderr, llm)
-
-                        # Update the plan step's code with the fixed version
-                        prev_step_idx = max(0, current_step - 1)
-                        if prev_step_idx < len(plan):
-                            plan[prev_step_idx]["code"] = fixed_code
-
-                        return {
-                            **state,
-                            "iterations": iterations,
-                            "plan": plan,
-                            "repair_attempts": repair_attempts + 1,
-                            "needs_retry": True,
-                            "current_step": prev_step_idx,  # go back to re-execute
-                            "step_retries": step_retries,
-                        }
-                except Exception as exc:
-                    logger.warning("[reflect] Code repair failed: %s", exc)
-
-            elif repair_attempts >= max_repairs:
+            if repair_attempts >= settings.MAX_CODE_REPAIR_ATTEMPTS:
                 logger.warning(
                     "[reflect] Code repair exhausted (%d attempts) — moving on",
-                    max_repairs,
+                    settings.MAX_CODE_REPAIR_ATTEMPTS,
                 )
                 # Reset repair attempts and fall through
                 return {
-                    **state,
                     "iterations": iterations,
                     "repair_attempts": 0,
                     "needs_retry": False,
@@ -172,7 +236,6 @@ async def reflect(state: AgentState) -> AgentState:
                     new_retries, current_step, last_tool,
                 )
                 return {
-                    **state,
                     "iterations": iterations,
                     "step_retries": new_retries,
                     "needs_retry": True,
@@ -188,28 +251,26 @@ async def reflect(state: AgentState) -> AgentState:
         # -- 2c. Reset repair_attempts on success ---
         if last_success and repair_attempts > 0:
             logger.info("[reflect] Code repair succeeded after %d attempts", repair_attempts)
-            state = {**state, "repair_attempts": 0}
+            repair_attempts = 0
 
         # -- 2d. Output too short for QUESTION intent → inject research fallback --
-        if last_success and len(last_output) < _MIN_USEFUL_OUTPUT_LEN and intent == "QUESTION":
-            already_researched = any(
-                r.get("tool_name") == "research_tool" for r in tool_results
-            )
+        if last_success and last_output_chars < _MIN_USEFUL_OUTPUT_LEN and intent == QUESTION:
+            already_researched = "research_tool" in state.get("tools_used", ())
             if not already_researched:
                 logger.info(
                     "[reflect] RAG output too short (%d chars) — injecting research fallback",
-                    len(last_output),
+                    last_output_chars,
                 )
-                plan.append({
+                plan = [*plan, {
                     "tool": "research_tool",
                     "description": "Fallback web search (RAG returned insufficient results)",
-                })
+                }]
                 return {
-                    **state,
                     "iterations": iterations,
                     "plan": plan,
                     "needs_retry": True,
                     "step_retries": 0,
+                    "repair_attempts": repair_attempts,
                 }
 
     # -- 3. More plan steps remaining? -------------------------------------------
@@ -217,12 +278,13 @@ async def reflect(state: AgentState) -> AgentState:
         logger.info(
             "[reflect] CONTINUE: next step %d/%d", current_step + 1, len(plan)
         )
-        return {**state, "iterations": iterations, "needs_retry": True, "step_retries": 0}
+        return {"iterations": iterations, "needs_retry": True, "step_retries": 0,
+                "repair_attempts": repair_attempts}
 
     # -- 4. All steps complete ---------------------------------------------------
     logger.info("[reflect] RESPOND: all %d plan step(s) complete", len(plan))
-    return {**state, "iterations": iterations, "needs_retry": False,
-            "stopped_reason": "plan_complete"}
+    return {"iterations": iterations, "needs_retry": False,
+            "stopped_reason": "plan_complete", "repair_attempts": repair_attempts}
 
 
 def should_continue(state: AgentState) -> str:
@@ -233,24 +295,22 @@ def should_continue(state: AgentState) -> str:
         'retry'    -> route back to tool_router (after code repair)
         'respond'  -> proceed to response_generator
     """
-    iterations = state.get("iterations", 0)
-    total_tokens = state.get("total_tokens", 0)
-
-    if iterations >= MAX_AGENT_ITERATIONS:
-        logger.warning("[reflect] Edge: FORCE STOP due to iteration limit")
+    get = state.get
+    iterations = get("iterations", 0)
+    total_tokens = get("total_tokens", 0)
+
+    if iterations >= MAX_AGENT_ITERATIONS or total_tokens >= TOKEN_BUDGET:
+        logger.warning(
+            "[reflect] Edge: FORCE STOP | iterations=%d/%d | tokens=%d/%d",
+            iterations, MAX_AGENT_ITERATIONS, total_tokens, TOKEN_BUDGET,
+        )
         return "respond"
 
-    if total_tokens >= TOKEN_BUDGET:
-        logger.warning("[reflect] Edge: FORCE STOP due to token budget")
+    if not get("needs_retry", False):
+        logger.debug("[reflect] Edge decision: respond")
         return "respond"
 
-    if state.get("needs_retry", False):
-        # Check if this is a code repair retry
-        if state.get("repair_attempts", 0) > 0:
-            logger.debug("[reflect] Edge decision: retry (code repair)")
-            return "retry"
-        logger.debug("[reflect] Edge decision: continue")
-        return "continue"
-
-    logger.debug("[reflect] Edge decision: respond")
-    return "respond"
+    # A pending code repair re-executes the repaired step
+    decision = "retry" if get("repair_attempts", 0) > 0 else "continue"
+    logger.debug("[reflect] Edge decision: %s", decision)
+    return decision
@@ -2,20 +2,32 @@
 
 Supports:
 - Conditional skip: step with "conditional": "if_previous_empty" is skipped
-  if the previous tool returned non-empty successful output.
+  if the previous tool returned non-empty successful output. The planner
+  compiles conditionals to ``_cond_code`` opcodes dispatched via a table.
 - Tool chaining: step with "uses_previous_output": True gets the previous
   tool's output injected as previous_context/previous_metadata kwargs.
 - Step-by-step SSE streaming: emits step/step_done events for each tool.
 - Data profiler and file generator dispatch.
+- Delta returns: the node returns only the keys it changed; LangGraph merges
+  them into the running state, so the full state is never copied.
 """
 
 from __future__ import annotations
 
 import logging
 import time
-from typing import Any, Dict
-
-from app.services.agent.state import AgentState, ToolResult, compress_tool_result
+from typing import Any, Callable, Deque, Dict, Optional
+
+from app.services.agent.state import (
+    AgentState,
+    ToolResult,
+    bounded_history,
+    compress_tool_result,
+    summarize_tool_result,
+)
+from app.services.agent.planner import COND_IF_PREVIOUS_EMPTY
+from app.services.agent.tools.data_profiler import profile_dataset
+from app.services.agent.tools.file_generator import generate_file
 from app.services.agent.tools_registry import get_tool, list_tools
 
 logger = logging.getLogger(__name__)
@@ -31,6 +43,82 @@ _STEP_LABELS = {
     "data_profiler": "🧠 Analyzing dataset structure",
     "file_generator": "📄 Generating file",
 }
+_format_default_step_label = "⚙️ Running {}".format
+
+
+def _step_label(tool_name: str) -> str:
+    """SSE label for a tool; the fallback string is only built for unknown tools."""
+    label = _STEP_LABELS.get(tool_name)
+    return label if label is not None else _format_default_step_label(tool_name)
+
+
+def _previous_was_empty(tool_results: Deque[ToolResult]) -> bool:
+    """True unless the last tool returned non-empty successful output."""
+    last = tool_results[-1] if tool_results else None
+    return not (last and last.success and (last.output or "").strip())
+
+
+# Step-conditional opcode (compiled by the planner) → "should this step run?"
+_COND_HANDLERS: Dict[int, Callable[[Deque[ToolResult]], bool]] = {
+    COND_IF_PREVIOUS_EMPTY: _previous_was_empty,
+}
+
+# Registry entries memoized on first lookup — steady state is one dict get.
+_TOOL_CACHE: Dict[str, Dict[str, Any]] = {}
+
+
+def _lookup(tool_name: str) -> Optional[Dict[str, Any]]:
+    """Return the registry entry for ``tool_name``, caching hits at module level."""
+    entry = _TOOL_CACHE.get(tool_name)
+    if entry is None:
+        entry = get_tool(tool_name)
+        if entry is not None:
+            _TOOL_CACHE[tool_name] = entry
+    return entry
+
+
+def _append_result(tool_results: Deque[ToolResult], result: ToolResult) -> Dict[str, Any]:
+    """Append ``result`` (compressed) to ``tool_results``; return the new summary_state."""
+    tool_results.append(compress_tool_result(result))
+    return summarize_tool_result(result)
+
+
+def _error_return(
+    state: AgentState,
+    tool_results: Deque[ToolResult],
+    step_log: Deque[Dict[str, Any]],
+    tool_name: str,
+    step_label: str,
+    step_time: float,
+    output: str,
+    error: str,
+) -> AgentState:
+    """Record a failed step and return the router's state delta for it."""
+    summary = _append_result(tool_results, ToolResult(
+        tool_name=tool_name,
+        success=False,
+        output=output,
+        metadata={},
+        error=error,
+        tokens_used=0,
+    ))
+    step_log.append({
+        "tool": tool_name,
+        "label": step_label,
+        "status": "error",
+        "time_taken": round(step_time, 2),
+        "stderr": error,
+    })
+    return {
+        "tool_results": tool_results,
+        "selected_tool": tool_name,
+        "tools_used": {*state.get("tools_used", ()), tool_name},
+        "summary_state": summary,
+        "current_step": state.get("current_step", 0) + 1,
+        "step_retries": 0,
+        "step_log": step_log,
+        "total_tool_calls": state.get("total_tool_calls", 0) + 1,
+    }
 
 
 async def route_and_execute(state: AgentState) -> AgentState:
@@ -48,8 +136,8 @@ async def route_and_execute(state: AgentState) -> AgentState:
     plan = state.get("plan", [])
     current_step = state.get("current_step", 0)
     iterations = state.get("iterations", 0)
-    tool_results = list(state.get("tool_results", []))
-    step_log = list(state.get("step_log", []))
+    tool_results = bounded_history(state.get("tool_results"))
+    step_log = bounded_history(state.get("step_log"))
     intent = state.get("intent", "UNKNOWN")
 
     if current_step >= len(plan):
@@ -57,27 +145,23 @@ async def route_and_execute(state: AgentState) -> AgentState:
             "[router] No more steps in plan | step=%d plan_len=%d",
             current_step, len(plan),
         )
-        return state
+        return {}
 
     step = plan[current_step]
     tool_name: str = step.get("tool", "")
     step_desc: str = step.get("description", "")
-    step_label = _STEP_LABELS.get(tool_name, f"⚙️ Running {tool_name}")
+    step_label = _step_label(tool_name)
 
     # -- Check conditional execution ------------------------------------------
-    if step.get("conditional") == "if_previous_empty":
-        last_result = tool_results[-1] if tool_results else None
-        if last_result and last_result.get("success") and (last_result.get("output") or "").strip():
-            logger.info(
-                "[router] Skipping conditional step '%s' — previous tool had results",
-                tool_name,
-            )
-            return {
-                **state,
-                "current_step": current_step + 1,
-            }
-
-    step_start = time.time()
+    if (cond := step.get("_cond_code")) and not _COND_HANDLERS[cond](tool_results):
+        logger.info(
+            "[router] Skipping conditional step '%s' — condition %r not met",
+            tool_name, step.get("conditional"),
+        )
+        return {"current_step": current_step + 1}
+
+    step_start = time.perf_counter()
+    tools_used = {*state.get("tools_used", ()), tool_name}
 
     logger.info(
         "[router] Executing | intent=%s | step=%d/%d | tool=%s | iter=%d | desc=%r",
@@ -90,164 +174,113 @@ async def route_and_execute(state: AgentState) -> AgentState:
     )
 
     # -- Handle special tools directly ----------------------------------------
-
-    # Data profiler: runs directly, not through tool registry
-    if tool_name == "data_profiler":
-        try:
-            from app.services.agent.tools.data_profiler import profile_dataset
-            updated_state = await profile_dataset(state)
-            step_time = time.time() - step_start
-
-            result = ToolResult(
-                tool_name="data_profiler",
-                success=True,
-                output=f"Dataset profiled: {updated_state.get('analysis_context', {}).get('shape', 'unknown')}",
-                metadata=updated_state.get("analysis_context", {}),
-                tokens_used=0,
-            )
-            tool_results.append(compress_tool_result(result))
-
-            step_log.append({
-                "tool": tool_name,
-                "label": step_label,
-                "status": "success",
-                "time_taken": round(step_time, 2),
-            })
-
-            return {
-                **updated_state,
-                "tool_results": tool_results,
-                "selected_tool": tool_name,
-                "current_step": current_step + 1,
-                "step_retries": 0,
-                "step_log": step_log,
-                "total_tool_calls": state.get("total_tool_calls", 0) + 1,
-            }
-        except Exception as exc:
-            logger.exception("[router] data_profiler failed: %s", exc)
-            step_time = time.time() - step_start
-            result = ToolResult(
-                tool_name="data_profiler",
-                success=False,
-                output="Dataset profiling failed.",
-                metadata={},
-                error=str(exc),
-                tokens_used=0,
-            )
-            tool_results.append(compress_tool_result(result))
-            step_log.append({
-                "tool": tool_name,
-                "label": step_label,
-                "status": "error",
-                "time_taken": round(step_time, 2),
-                "stderr": str(exc),
-            })
-            return {
-                **state,
-                "tool_results": tool_results,
-                "selected_tool": tool_name,
-                "current_step": current_step + 1,
-                "step_retries": 0,
-                "step_log": step_log,
-                "total_tool_calls": state.get("total_tool_calls", 0) + 1,
-            }
-
-    # File generator: runs directly, not through tool registry
-    if tool_name == "file_generator":
-        try:
-            from app.services.agent.tools.file_generator import generate_file
-            # Get code from the plan step or from the last tool result
-            code = step.get("code", "")
-            if not code and tool_results:
-                last = tool_results[-1]
-                code = last.get("metadata", {}).get("generated_code", "")
-
-            result = await generate_file(state, code)
-            step_time = time.time() - step_start
-
-            # Update generated_files in state
-            new_files = result.get("metadata", {}).get("generated_files", [])
-            generated_files = list(state.get("generated_files", []))
-            generated_files.extend(new_files)
-
-            step_log_entry = {
-                "tool": tool_name,
-                "label": step_label,
-                "status": "success" if result.get("success") else "error",
-                "time_taken": round(step_time, 2),
-                "code": code,
-                "stdout": result.get("metadata", {}).get("stdout", ""),
-                "stderr": result.get("metadata", {}).get("stderr", ""),
-            }
-            step_log.append(step_log_entry)
-            tool_results.append(compress_tool_result(result))
-
-            return {
-                **state,
-                "tool_results": tool_results,
-                "selected_tool": tool_name,
-                "current_step": current_step + 1,
-                "step_retries": 0,
-                "step_log": step_log,
-                "generated_files": generated_files,
-                "last_stdout": result.get("metadata", {}).get("stdout", ""),
-                "last_stderr": result.get("metadata", {}).get("stderr", ""),
-                "total_tool_calls": state.get("total_tool_calls", 0) + 1,
-            }
-        except Exception as exc:
-            logger.exception("[router] file_generator failed: %s", exc)
-            step_time = time.time() - step_start
-            result = ToolResult(
-                tool_name="file_generator",
-                success=False,
-                output=f"File generation failed: {str(exc)}",
-                metadata={},
-                error=str(exc),
-                tokens_used=0,
-            )
-            tool_results.append(compress_tool_result(result))
-            step_log.append({
-                "tool": tool_name,
-                "label": step_label,
-                "status": "error",
-                "time_taken": round(step_time, 2),
-                "stderr": str(exc),
-            })
-            return {
-                **state,
-                "tool_results": tool_results,
-                "selected_tool": tool_name,
-                "current_step": current_step + 1,
-                "step_retries": 0,
-                "step_log": step_log,
-                "total_tool_calls": state.get("total_tool_calls", 0) + 1,
-            }
+    match tool_name:
+        # Data profiler: runs directly, not through tool registry
+        case "data_profiler":
+            try:
+                analysis_context = (await profile_dataset(state))["analysis_context"]
+                step_time = time.perf_counter() - step_start
+
+                result = ToolResult(
+                    tool_name="data_profiler",
+                    success=True,
+                    output=f"Dataset profiled: {analysis_context.get('shape', 'unknown')}",
+                    metadata=analysis_context,
+                    tokens_used=0,
+                )
+                summary = _append_result(tool_results, result)
+
+                step_log.append({
+                    "tool": tool_name,
+                    "label": step_label,
+                    "status": "success",
+                    "time_taken": round(step_time, 2),
+                })
+
+                return {
+                    "analysis_context": analysis_context,
+                    "tool_results": tool_results,
+                    "selected_tool": tool_name,
+                    "tools_used": tools_used,
+                    "summary_state": summary,
+                    "current_step": current_step + 1,
+                    "step_retries": 0,
+                    "step_log": step_log,
+                    "total_tool_calls": state.get("total_tool_calls", 0) + 1,
+                }
+            except Exception as exc:
+                logger.exception("[router] data_profiler failed: %s", exc)
+                return _error_return(
+                    state, tool_results, step_log, tool_name, step_label,
+                    time.perf_counter() - step_start,
+                    output="Dataset profiling failed.",
+                    error=str(exc),
+                )
+
+        # File generator: runs directly, not through tool registry
+        case "file_generator":
+            try:
+                # Get code from the plan step or from the last tool result
+                code = step.get("code", "")
+                if not code and tool_results:
+                    last = tool_results[-1]
+                    code = last.get("metadata", {}).get("generated_code", "")
+
+                result = await generate_file(state, code)
+                step_time = time.perf_counter() - step_start
+
+                # Update generated_files in state
+                new_files = result.get("metadata", {}).get("generated_files", [])
+                generated_files = [*state.get("generated_files", ()), *new_files]
+
+                step_log_entry = {
+                    "tool": tool_name,
+                    "label": step_label,
+                    "status": "success" if result.get("success") else "error",
+                    "time_taken": round(step_time, 2),
+                    "code": code,
+                    "stdout": result.get("metadata", {}).get("stdout", ""),
+                    "stderr": result.get("metadata", {}).get("stderr", ""),
+                }
+                step_log.append(step_log_entry)
+                summary = _append_result(tool_results, result)
+
+                return {
+                    "tool_results": tool_results,
+                    "selected_tool": tool_name,
+                    "tools_used": tools_used,
+                    "summary_state": summary,
+                    "current_step": current_step + 1,
+                    "step_retries": 0,
+                    "step_log": step_log,
+                    "generated_files": generated_files,
+                    "last_stdout": result.get("metadata", {}).get("stdout", ""),
+                    "last_stderr": result.get("metadata", {}).get("stderr", ""),
+                    "total_tool_calls": state.get("total_tool_calls", 0) + 1,
+                }
+            except Exception as exc:
+                logger.exception("[router] file_generator failed: %s", exc)
+                return _error_return(
+                    state, tool_results, step_log, tool_name, step_label,
+                    time.perf_counter() - step_start,
+                    output=f"File generation failed: {str(exc)}",
+                    error=str(exc),
+                )
 
     # -- Look up tool (NO silent fallback) ----------------------------------------
-    tool_entry = get_tool(tool_name)
+    tool_entry = _lookup(tool_name)
     if tool_entry is None:
         logger.error(
             "[router] Tool '%s' not registered. Available tools: %s",
             tool_name,
             list_tools(),
         )
-        error_result = ToolResult(
-            tool_name=tool_name,
-            success=False,
+        return _error_return(
+            state, tool_results, step_log, tool_name, step_label,
+            time.perf_counter() - step_start,
             output=f"Tool '{tool_name}' is not available.",
-            metadata={},
             error=f"Tool '{tool_name}' is not registered in the tool registry.",
-            tokens_used=0,
         )
-        tool_results.append(error_result)
-        return {
-            **state,
-            "tool_results": tool_results,
-            "selected_tool": tool_name,
-            "current_step": current_step + 1,
-            "step_retries": 0,
-            "total_tool_calls": state.get("total_tool_calls", 0) + 1,
-        }
 
     # -- Build kwargs from state --------------------------------------------------
     user_message: str = state.get("user_message", "")
@@ -291,7 +324,7 @@ async def route_and_execute(state: AgentState) -> AgentState:
         )
 
     # -- Log outcome --------------------------------------------------------------
-    success = result.get("success", False)
+    success = result.success
     output_preview = (result.get("output") or "")[:120]
     logger.info(
         "[router] Result | tool=%s | success=%s | output=%r | iter=%d",
@@ -307,9 +340,9 @@ async def route_and_execute(state: AgentState) -> AgentState:
             result.get("error", "unknown"),
         )
 
-    step_time = time.time() - step_start
-    tokens_used = result.get("tokens_used", 0)
-    tool_results.append(compress_tool_result(result))
+    step_time = time.perf_counter() - step_start
+    tokens_used = result.tokens_used
+    summary = _append_result(tool_results, result)
 
     # -- Record step log entry ---------------------------------------------------
     step_log_entry = {
@@ -335,9 +368,10 @@ async def route_and_execute(state: AgentState) -> AgentState:
     last_stderr = result.get("metadata", {}).get("stderr", result.get("error", "")) if not success else ""
 
     return {
-        **state,
         "tool_results": tool_results,
         "selected_tool": tool_name,
+        "tools_used": tools_used,
+        "summary_state": summary,
         "current_step": current_step + 1,
         "step_retries": 0,
         "step_log": step_log,
@@ -1,16 +1,22 @@
 """Agent state schema for LangGraph.
 
-Defines the TypedDict that flows through every node in the agent graph.
+Defines the TypedDict that flows through every node in the agent graph,
+and the ToolResult record every tool returns.
 """
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, TypedDict
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, NamedTuple, Optional, Set, TypedDict
 
 
-class ToolResult(TypedDict, total=False):
+class ToolResult(NamedTuple):
     """Result from a single tool execution.
 
+    A NamedTuple rather than a dict: results are never mutated after
+    creation (use ``_replace``), and fixed slots halve the per-result
+    footprint of ``tool_results``. Construct with keyword arguments.
+
     Required contract — every tool MUST set these three fields:
         success  : bool  – whether the tool call succeeded
         output   : str   – human-readable response string (may be empty on failure)
@@ -22,13 +28,21 @@ class ToolResult(TypedDict, total=False):
         tokens_used   : int  – rough token consumption estimate
         output_summary: str  – truncated version for LLM context (set by compress_tool_result)
     """
-    tool_name: str
-    success: bool
-    output: str        # canonical plain-text response — always set
-    metadata: Dict     # structured payload (quiz questions, chart b64, etc.)
-    error: Optional[str]
-    tokens_used: int
-    output_summary: str  # truncated — used in LLM planning context
+    tool_name: str = ""
+    success: bool = False
+    output: str = ""                     # canonical plain-text response — always set
+    metadata: Optional[Dict] = None      # structured payload (quiz questions, chart b64, etc.)
+    error: Optional[str] = None
+    tokens_used: int = 0
+    output_summary: Optional[str] = None  # truncated — used in LLM planning context
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Dict-style read for callers written against the former TypedDict.
+
+        Unset (``None``) fields return ``default``, matching a missing key.
+        """
+        value = getattr(self, key, None)
+        return default if value is None else value
 
 
 _SUMMARY_MAX_CHARS = 500
@@ -40,16 +54,57 @@ def compress_tool_result(result: ToolResult) -> ToolResult:
     The full ``output`` is preserved for the response_generator; only
     ``output_summary`` should be passed into subsequent LLM calls (planner,
     reflection) to save tokens.
+
+    Idempotent: a result that already carries ``output_summary`` (e.g. one
+    served from the router's memo cache) is returned without re-scanning.
+
+    ToolResult is immutable, so this cannot assign in place; instead the
+    new record shares every field (``output``, ``metadata``…) with the
+    original by reference — nothing but the 7-slot tuple is allocated.
     """
-    full = result.get("output", "")
+    if result.output_summary is not None:
+        return result
+    full = result.output or ""
     summary = (full[:_SUMMARY_MAX_CHARS] + "…") if len(full) > _SUMMARY_MAX_CHARS else full
-    return {**result, "output_summary": summary}
+    # output_summary is the last field: positional construction skips
+    # _replace's per-call kwargs dict and field-name mapping.
+    return ToolResult(*result[:-1], summary)
+
+
+def summarize_tool_result(result: ToolResult) -> Dict[str, Any]:
+    """Build the ``summary_state`` for the latest tool ``result``.
+
+    Reflection reads the latest outcome from here instead of indexing
+    ``tool_results`` and re-stripping a potentially large ``output``.
+    """
+    return {
+        "last_tool": result.tool_name or "?",
+        "last_success": bool(result.success),
+        "last_output_chars": len((result.output or "").strip()),
+        "last_error": result.error or "",
+    }
+
+
+def bounded_history(items: Optional[Iterable] = None) -> Deque:
+    """Return ``items`` as a deque capped at ``MAX_TOOL_CALLS`` entries.
+
+    An already-bounded deque is returned as-is so nodes can append in place;
+    anything else (e.g. the ``[]`` route handlers seed) is wrapped once.
+    """
+    if isinstance(items, deque) and items.maxlen == MAX_TOOL_CALLS:
+        return items
+    return deque(items or (), maxlen=MAX_TOOL_CALLS)
 
 
 class AgentState(TypedDict, total=False):
     """Full state flowing through the LangGraph agent pipeline.
 
     Every node reads/writes fields from this dict.
+
+    Kept as a TypedDict rather than a slotted dataclass: nodes return partial
+    delta dicts that LangGraph merges per key, and route handlers seed it with
+    plain dict literals. Hot-path reads are batched instead (see the
+    itemgetter in reflection.reflect_sync).
     """
     # ── Input ─────────────────────────────────────────────
     user_message: str
@@ -70,7 +125,9 @@ class AgentState(TypedDict, total=False):
     # ── Tool Execution ────────────────────────────────────
     selected_tool: str             # Tool to execute next
     tool_input: Dict[str, Any]     # Input for the tool
-    tool_results: List[ToolResult] # Accumulated results from tool executions
+    tool_results: Deque[ToolResult]  # Accumulated results, capped at MAX_TOOL_CALLS (oldest evicted)
+    tools_used: Set[str]           # names of every tool executed so far (O(1) membership checks)
+    summary_state: Dict[str, Any]  # latest tool outcome (see summarize_tool_result)
 
     # ── Reflection & Safety ───────────────────────────────
     needs_retry: bool              # Whether the reflector decided to retry
@@ -99,7 +156,7 @@ class AgentState(TypedDict, total=False):
 
     # ── Edit & Step Tracking ──────────────────────────────
     edit_history: List[Dict]       # log of append/replace/delete ops
-    step_log: List[Dict]           # each step: {tool, label, status, time_taken, code, stdout, stderr}
+    step_log: Deque[Dict]          # capped like tool_results; each step: {tool, label, status, time_taken, code, stdout, stderr}
     repair_attempts: int           # current repair loop counter, default 0
 
 
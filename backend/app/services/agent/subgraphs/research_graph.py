@@ -18,10 +18,17 @@ import json
 import logging
 import re
 import time
-from typing import Any, AsyncIterator, Dict, List
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from urllib.parse import quote_plus
 
 import httpx
+import orjson
+
+try:
+    import trafilatura
+except ImportError:  # optional — _html_to_text is the fallback extractor
+    trafilatura = None
 
 logger = logging.getLogger(__name__)
 
@@ -31,32 +38,157 @@ MAX_SEARCH_QUERIES = 10
 MAX_TOTAL_URLS = 15
 MAX_TIME_SECONDS = 45
 
+# Extraction runs at most this many fetches at once and must finish within
+# 80% of MAX_TIME_SECONDS (searching + extraction share that window).
+_EXTRACT_CONCURRENCY = 6
+_EXTRACT_DEADLINE_SECONDS = MAX_TIME_SECONDS * 0.8
+
+# Per-source prompt budget for synthesis (≈4 chars/token, the same rough
+# ratio token_counter falls back to).
+_SOURCE_TOKEN_BUDGET = 800
+_CHARS_PER_TOKEN = 4
+
+# ── JSON Helpers ──────────────────────────────────────────────
+# orjson for the report payloads (tens of KB); stdlib json only as a lenient
+# fallback for LLM output orjson rejects (e.g. NaN literals).
+
+def _dumps(obj: Any) -> str:
+    return orjson.dumps(obj).decode()
+
+
+def _loads(text: str) -> Any:
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return json.loads(text)
+
+
+# ── Compiled Patterns ─────────────────────────────────────────
+
+_DDG_RESULT_RE = re.compile(r'class="result__a"[^>]*href="([^"]+)"[^>]*>([^<]+)</a>')
+_JSON_ARRAY_RE = re.compile(r'\[[\s\S]*\]')
+_JSON_OBJECT_RE = re.compile(r'\{[\s\S]*\}')
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+_WORD_RE = re.compile(r'\w+')
+
+# ── Prompt Prefixes ───────────────────────────────────────────
+# Invariant instructions lead each prompt and the per-request data is appended
+# last, so providers with automatic prefix caching can reuse the prefix.
+
+_QUERY_PROMPT_PREFIX = """You are a research planner. Generate 5-10 highly targeted search queries for the topic given at the end.
+
+Return ONLY a JSON array of strings:
+["query 1", "query 2"]
+
+"""
+
+_SYNTHESIS_PROMPT_PREFIX = """Synthesize a complete research report based on the context sources given at the end.
+
+You MUST return your answer as a raw JSON object with the EXACT following keys.
+Write ONLY valid JSON.
+
+{
+  "executive_summary": "A 2-3 sentence high level summary of the findings.",
+  "key_findings": [
+    "string finding 1 with [SOURCE N] citation",
+    "string finding 2 with [SOURCE N] citation"
+  ],
+  "data_points": [
+    "numeric fact 1 with [SOURCE N] citation",
+    ...
+  ],
+  "conclusion": "A concluding thought or implications.",
+  "sources": []
+}
+
+Do NOT put markdown backticks around the JSON. Return raw JSON.
+Leave the "sources" list array EXACTLY EMPTY `[]`, we will populate it natively later.
+
+"""
+
+
+# ── LLM Result Caches ─────────────────────────────────────────
+# In-process LRUs so repeated research on the same topic skips the LLM.
+# Queries are keyed on the normalised user query; reports additionally on the
+# exact source URL set and expire after an hour since the web moves on.
+
+_QUERY_CACHE_MAX = 512
+_REPORT_CACHE_MAX = 128
+_REPORT_CACHE_TTL_SECONDS = 3600
+
+_query_cache: OrderedDict[str, List[str]] = OrderedDict()
+_report_cache: OrderedDict[Tuple[str, Tuple[str, ...]], Tuple[float, str]] = OrderedDict()
+
+
+def _query_key(user_query: str) -> str:
+    return " ".join(user_query.lower().split())
+
+
+def _report_key(user_query: str, sources: List[Dict[str, str]]) -> Tuple[str, Tuple[str, ...]]:
+    return _query_key(user_query), tuple(sorted(s["url"] for s in sources))
+
+
+def _lru_put(cache: OrderedDict, key: Any, value: Any, max_size: int) -> None:
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_size:
+        cache.popitem(last=False)
+
+
+def _cached_report(key: Tuple[str, Tuple[str, ...]]) -> Optional[str]:
+    entry = _report_cache.get(key)
+    if entry is None:
+        return None
+    stored_at, report_json = entry
+    if time.monotonic() - stored_at > _REPORT_CACHE_TTL_SECONDS:
+        del _report_cache[key]
+        return None
+    _report_cache.move_to_end(key)
+    return report_json
+
 
 # ── Core Implementation ───────────────────────────────────────
 
+def _research_client() -> httpx.AsyncClient:
+    """One pooled HTTP/2 client shared by the search and extraction phases."""
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=10.0,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+    )
+
+
 async def run_research(
     user_query: str,
     user_id: str,
     notebook_id: str,
     material_ids: list[str] | None = None,
-) -> str:
-    """Run the minimal deep research pipeline and return the JSON report string."""
+) -> Tuple[bool, str]:
+    """Run the minimal deep research pipeline.
+
+    Returns ``(ok, report_json)``; ``ok`` is False when no sources could be
+    extracted or synthesis failed, in which case the report carries the
+    failure explanation.
+    """
     start_time = time.time()
     
     # 1. Generate Queries
     queries = await _generate_queries(user_query)
     
-    # 2. Search execution
-    urls = await _execute_searches(queries, start_time)
-    
-    # 3. Content extraction
-    sources = await _extract_content(urls, start_time)
+    async with _research_client() as client:
+        # 2. Search execution
+        urls = await _execute_searches(queries, start_time, client)
+
+        # 3. Content extraction
+        sources = await _extract_content(urls, start_time, client, user_query)
     
     # Proceed with whatever sources are available (1 or more)
     if len(sources) == 0:
         error_msg = "Failed to extract any valid sources. Consider broadening your query."
-        logger.warning(f"Research failed: {error_msg}")
-        return json.dumps({
+        logger.warning("Research failed: %s", error_msg)
+        return False, _dumps({
             "executive_summary": error_msg,
             "key_findings": [],
             "data_points": [],
@@ -65,9 +197,7 @@ async def run_research(
         })
 
     # 4. Report Synthesis — add note about source count if limited
-    report_json = await _synthesize_report(user_query, sources)
-    
-    return report_json
+    return await _synthesize_report(user_query, sources)
 
 
 async def run_research_stream(
@@ -84,18 +214,19 @@ async def run_research_stream(
     queries = await _generate_queries(user_query)
     yield 'event: research_step\ndata: {"node": "planning", "status": "complete"}\n\n'
 
-    # Phase 2: Searching
-    yield 'event: research_step\ndata: {"node": "searching", "status": "active"}\n\n'
-    urls = await _execute_searches(queries, start_time)
-    yield 'event: research_step\ndata: {"node": "searching", "status": "complete"}\n\n'
+    async with _research_client() as client:
+        # Phase 2: Searching
+        yield 'event: research_step\ndata: {"node": "searching", "status": "active"}\n\n'
+        urls = await _execute_searches(queries, start_time, client)
+        yield 'event: research_step\ndata: {"node": "searching", "status": "complete"}\n\n'
 
-    # Phase 3: Extracting
-    yield 'event: research_step\ndata: {"node": "extracting", "status": "active"}\n\n'
-    sources = await _extract_content(urls, start_time)
-    yield 'event: research_step\ndata: {"node": "extracting", "status": "complete"}\n\n'
+        # Phase 3: Extracting
+        yield 'event: research_step\ndata: {"node": "extracting", "status": "active"}\n\n'
+        sources = await _extract_content(urls, start_time, client, user_query)
+        yield 'event: research_step\ndata: {"node": "extracting", "status": "complete"}\n\n'
 
     if len(sources) == 0:
-        error_data = json.dumps({"error": "No valid sources found"})
+        error_data = _dumps({"error": "No valid sources found"})
         yield f"event: error\ndata: {error_data}\n\n"
         return
 
@@ -107,88 +238,101 @@ async def run_research_stream(
     # Phase 5: Writing
     yield 'event: research_step\ndata: {"node": "writing", "status": "active"}\n\n'
     try:
-        report_json = await _synthesize_report(user_query, sources)
+        _, report_json = await _synthesize_report(user_query, sources)
         yield 'event: research_step\ndata: {"node": "writing", "status": "complete"}\n\n'
         yield f"event: final_report\ndata: {report_json}\n\n"
         yield 'event: done\ndata: {}\n\n'
     except Exception as e:
         logger.exception("Research stream failed during synthesis")
-        error_data = json.dumps({"error": str(e)})
+        error_data = _dumps({"error": str(e)})
         yield f"event: error\ndata: {error_data}\n\n"
 
 
 async def _generate_queries(user_query: str) -> List[str]:
     """Generate 5-10 targeted search queries."""
+    key = _query_key(user_query)
+    cached = _query_cache.get(key)
+    if cached is not None:
+        _query_cache.move_to_end(key)
+        logger.info("[research] Query cache hit for %r", key)
+        return list(cached)
+
     from app.services.llm_service.llm import get_llm
     llm = get_llm(mode="creative")
     
-    prompt = f"""You are a research planner. Generate 5-10 highly targeted search queries for this topic:
-Topic: "{user_query}"
-
-Return ONLY a JSON array of strings:
-["query 1", "query 2"]
+    prompt = f"""{_QUERY_PROMPT_PREFIX}Topic: "{user_query}"
 """
     try:
         resp = await llm.ainvoke(prompt)
         text = getattr(resp, "content", str(resp)).strip()
-        match = re.search(r'\[[\s\S]*\]', text)
+        match = _JSON_ARRAY_RE.search(text)
         if match:
-            queries = json.loads(match.group())
+            queries = _loads(match.group())
             if isinstance(queries, list) and len(queries) > 0:
-                return queries[:MAX_SEARCH_QUERIES]
+                queries = queries[:MAX_SEARCH_QUERIES]
+                _lru_put(_query_cache, key, queries, _QUERY_CACHE_MAX)
+                return list(queries)
     except Exception as e:
-        logger.warning(f"Failed to generate queries, falling back: {e}")
+        logger.warning("Failed to generate queries, falling back: %s", e)
         
     return [user_query]
 
 
-async def _execute_searches(queries: List[str], start_time: float) -> List[Dict[str, str]]:
-    """Concurrent barebones DuckDuckGo HTML scraping."""
+_USER_AGENTS = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/121.0",
+)
+_SEARCH_STAGGER_SECONDS = 0.2  # start offset between queries to avoid DDG rate limiting
+
+
+async def _execute_searches(
+    queries: List[str], start_time: float, client: httpx.AsyncClient,
+) -> List[Dict[str, str]]:
+    """Concurrent barebones DuckDuckGo HTML scraping.
+
+    Queries are fired concurrently with staggered start times instead of
+    one after another, so the phase costs ~one RTT plus the stagger.
+    """
     results = []
     seen_urls = set()
-    
-    # We serialize the request slightly to avoid DDG rate limiting
-    async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
-        # Round robin user agents
-        user_agents = [
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0.0.0 Safari/537.36",
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 Safari/605.1.15",
-            "Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/121.0"
-        ]
-        
-        for i, query in enumerate(queries):
+
+    async def search_one(i: int, query: str, client: httpx.AsyncClient) -> List[Dict[str, str]]:
+        await asyncio.sleep(_SEARCH_STAGGER_SECONDS * i)
+        elapsed = time.time() - start_time
+        if elapsed > (MAX_TIME_SECONDS * 0.4): # Allocate 40% time for searching
+            logger.warning("Research time limit approaching (%ss), skipping search.", elapsed)
+            return []
+        try:
+            headers = {"User-Agent": _USER_AGENTS[i % len(_USER_AGENTS)]}
+            url = f"https://html.duckduckgo.com/html/?q={quote_plus(query)}"
+            resp = await client.get(url, headers=headers)
+            if resp.status_code == 200:
+                return _parse_ddg_results(resp.text)
+        except Exception as e:
+            logger.warning("Search for '%s' failed: %s", query, e)
+        return []
+
+    tasks = [asyncio.create_task(search_one(i, q, client)) for i, q in enumerate(queries)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            for link in await next_done:
+                if link["url"] not in seen_urls:
+                    results.append(link)
+                    seen_urls.add(link["url"])
             if len(results) >= MAX_TOTAL_URLS:
                 break
-                
-            elapsed = time.time() - start_time
-            if elapsed > (MAX_TIME_SECONDS * 0.4): # Allocate 40% time for searching
-                logger.warning(f"Research time limit approaching ({elapsed}s), stopping search.")
-                break
-                
-            try:
-                headers = {"User-Agent": user_agents[i % len(user_agents)]}
-                url = f"https://html.duckduckgo.com/html/?q={quote_plus(query)}"
-                resp = await client.get(url, headers=headers)
-                
-                if resp.status_code == 200:
-                    links = _parse_ddg_results(resp.text)
-                    for link in links:
-                        if link["url"] not in seen_urls and len(results) < MAX_TOTAL_URLS:
-                            results.append(link)
-                            seen_urls.add(link["url"])
-                            
-                await asyncio.sleep(0.2) # Rate limit (reduced from 0.5s)
-            except Exception as e:
-                logger.warning(f"Search for '{query}' failed: {e}")
-                
-    return results
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    return results[:MAX_TOTAL_URLS]
 
 
 def _parse_ddg_results(html: str) -> List[Dict[str, str]]:
     """Regex-based DDG extraction."""
     results = []
-    pattern = r'class="result__a"[^>]*href="([^"]+)"[^>]*>([^<]+)</a>'
-    matches = re.findall(pattern, html)
+    matches = _DDG_RESULT_RE.findall(html)
     for href, title in matches:
         if href.startswith("http"):
             # Clean DDG redirect iff present
@@ -204,54 +348,120 @@ def _parse_ddg_results(html: str) -> List[Dict[str, str]]:
     return results[:7]
 
 
-async def _extract_content(search_results: List[Dict[str, str]], start_time: float) -> List[Dict[str, str]]:
-    """Concurrent fetching and trafilatura extraction."""
-    valid_sources = []
-    
+def _html_to_text(html: str) -> str:
+    """Plain-text fallback when trafilatura is unavailable.
+
+    Uses lxml's C parser when importable (it ships as a trafilatura
+    dependency, so is usually present); regex stripping is the last resort.
+    """
+    try:
+        import lxml.html
+        text = lxml.html.fromstring(html).text_content()
+    except ImportError:
+        text = _HTML_TAG_RE.sub(' ', html)
+    except Exception:  # lxml.etree.ParserError on empty/garbage documents
+        return ""
+    return " ".join(text.split())
+
+
+def _compress(content: str, user_query: str, max_tokens: int = _SOURCE_TOKEN_BUDGET) -> str:
+    """Extractively shrink *content* to roughly *max_tokens*.
+
+    Sentences are ranked by how many query terms they contain; the best ones
+    are kept (in original order) until the budget is spent. Content already
+    within budget is returned untouched.
+    """
+    max_chars = max_tokens * _CHARS_PER_TOKEN
+    if len(content) <= max_chars:
+        return content
+
+    terms = {t for t in _WORD_RE.findall(user_query.lower()) if len(t) > 2}
+    sentences = _SENTENCE_SPLIT_RE.split(content)
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: (-len(terms.intersection(_WORD_RE.findall(sentences[i].lower()))), i),
+    )
+
+    keep: List[int] = []
+    used = 0
+    for i in ranked:
+        cost = len(sentences[i]) + 1
+        if used + cost > max_chars:
+            continue
+        keep.append(i)
+        used += cost
+    if not keep:
+        return content[:max_chars]
+    return " ".join(sentences[i] for i in sorted(keep))
+
+
+async def _extract_content(
+    search_results: List[Dict[str, str]],
+    start_time: float,
+    client: httpx.AsyncClient,
+    user_query: str = "",
+) -> List[Dict[str, str]]:
+    """Concurrent fetching and trafilatura extraction.
+
+    Each source is compressed to ``_SOURCE_TOKEN_BUDGET`` by keeping the
+    sentences most relevant to *user_query* (see ``_compress``).
+    """
+    semaphore = asyncio.Semaphore(_EXTRACT_CONCURRENCY)
+
     async def fetch_and_extract(result: Dict[str, str], client: httpx.AsyncClient):
-        elapsed = time.time() - start_time
-        if elapsed > (MAX_TIME_SECONDS * 0.8): # Allocate 80% time for searching & extraction
-             return None
-             
-        try:
-             resp = await client.get(result["url"], headers={"User-Agent": "ResearchBot/1.0"})
-             if resp.status_code == 200:
-                 try:
-                     import trafilatura
-                     text = trafilatura.extract(resp.text, include_comments=False, include_tables=True)
-                     if text and len(text) > 100:
-                         return {
-                             "url": result["url"],
-                             "title": result.get("title", ""),
-                             "content": text[:4000] # Limit chunk size
-                         }
-                 except ImportError:
-                     # Fallback bare extraction
-                     text = re.sub(r'<[^>]+>', ' ', resp.text)
-                     text = re.sub(r'\s+', ' ', text).strip()
-                     if len(text) > 100:
-                         return {
-                             "url": result["url"],
-                             "title": result.get("title", ""),
-                             "content": text[:4000]
-                         }
-        except Exception:
-             pass
-        return None
+        async with semaphore:
+            elapsed = time.time() - start_time
+            if elapsed > _EXTRACT_DEADLINE_SECONDS:
+                return None
 
-    async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
-        tasks = [fetch_and_extract(res, client) for res in search_results]
-        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        for outcome in outcomes:
-            if outcome and not isinstance(outcome, Exception):
-                valid_sources.append(outcome)
-                
+            try:
+                resp = await client.get(result["url"], headers={"User-Agent": "ResearchBot/1.0"})
+                if resp.status_code != 200:
+                    return None
+                # HTML → text is CPU-bound; keep it off the event loop so SSE
+                # frames and other requests are not stalled by heavy pages.
+                if trafilatura is not None:
+                    text = await asyncio.to_thread(
+                        trafilatura.extract, resp.text, include_comments=False, include_tables=True,
+                    )
+                else:
+                    # Fallback bare extraction
+                    text = await asyncio.to_thread(_html_to_text, resp.text)
+                if text and len(text) > 100:
+                    return {
+                        "url": result["url"],
+                        "title": result.get("title", ""),
+                        "content": _compress(text, user_query),
+                    }
+            except Exception:
+                pass
+            return None
+
+    tasks = [asyncio.create_task(fetch_and_extract(res, client)) for res in search_results]
+    if not tasks:
+        return []
+    remaining = max(0.0, _EXTRACT_DEADLINE_SECONDS - (time.time() - start_time))
+    _, pending = await asyncio.wait(tasks, timeout=remaining)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning("Research extraction budget exhausted, dropped %d source(s).", len(pending))
+
+    valid_sources = [
+        task.result() for task in tasks
+        if task not in pending and not task.cancelled() and task.exception() is None and task.result()
+    ]
     return valid_sources
 
 
-async def _synthesize_report(user_query: str, sources: List[Dict[str, str]]) -> str:
-    """Generate final JSON structure."""
+async def _synthesize_report(user_query: str, sources: List[Dict[str, str]]) -> Tuple[bool, str]:
+    """Generate final JSON structure as ``(ok, report_json)``."""
+    key = _report_key(user_query, sources)
+    cached = _cached_report(key)
+    if cached is not None:
+        logger.info("[research] Report cache hit for %r (%d sources)", key[0], len(sources))
+        return True, cached
+
     from app.services.llm_service.llm import get_llm
     llm = get_llm(mode="chat")  # factual synthesis
     
@@ -263,51 +473,31 @@ async def _synthesize_report(user_query: str, sources: List[Dict[str, str]]) ->
         
     context_str = "\n\n".join(context_blocks)
     
-    prompt = f"""Synthesize a complete research report based on the provided context sources.
-
-Research Query: "{user_query}"
+    prompt = f"""{_SYNTHESIS_PROMPT_PREFIX}Research Query: "{user_query}"
 
 Context:
 {context_str}
-
-You MUST return your answer as a raw JSON object with the EXACT following keys.
-Write ONLY valid JSON.
-
-{{
-  "executive_summary": "A 2-3 sentence high level summary of the findings.",
-  "key_findings": [
-    "string finding 1 with [SOURCE N] citation",
-    "string finding 2 with [SOURCE N] citation"
-  ],
-  "data_points": [
-    "numeric fact 1 with [SOURCE N] citation",
-    ...
-  ],
-  "conclusion": "A concluding thought or implications.",
-  "sources": []
-}}
-
-Do NOT put markdown backticks around the JSON. Return raw JSON.
-Leave the "sources" list array EXACTLY EMPTY `[]`, we will populate it natively later.
 """
     try:
         resp = await llm.ainvoke(prompt)
         text = getattr(resp, "content", str(resp)).strip()
         
         # Strip markdown json block if provided
-        match = re.search(r'\{[\s\S]*\}', text)
+        match = _JSON_OBJECT_RE.search(text)
         if match:
             text = match.group()
             
-        data = json.loads(text)
+        data = _loads(text)
         
         # Populate sources natively to ensure correctness
         data["sources"] = source_list
-        return json.dumps(data)
+        report_json = _dumps(data)
+        _lru_put(_report_cache, key, (time.monotonic(), report_json), _REPORT_CACHE_MAX)
+        return True, report_json
         
     except Exception as e:
-        logger.error(f"Synthesis failed: {e}")
-        return json.dumps({
+        logger.error("Synthesis failed: %s", e)
+        return False, _dumps({
             "executive_summary": "Synthesis failed due to an error.",
             "key_findings": [],
             "data_points": [],
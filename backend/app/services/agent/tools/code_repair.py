@@ -18,16 +18,19 @@ _PROMPT_PATH = os.path.join(
 
 
 def _load_repair_prompt() -> str:
-    """Load the code repair prompt template."""
+    """Load the code repair prompt template.
+
+    Static rules and instructions come first and the per-call code/stderr
+    last, so the prompt prefix stays identical across calls (provider-side
+    prefix caching).
+    """
     try:
         with open(_PROMPT_PATH, "r") as f:
             return f.read()
     except FileNotFoundError:
         logger.warning("[code_repair] Prompt file not found, using inline fallback")
         return (
-            "You are a Python debugger. Your ONLY job is to fix the error below.\n\n"
-            "=== ORIGINAL CODE ===\n{broken_code}\n\n"
-            "=== ERROR MESSAGE ===\n{stderr}\n\n"
+            "You are a Python debugger. Your ONLY job is to fix the error in the code at the end.\n\n"
             "=== SANDBOX SECURITY RULES ===\n"
             "NEVER use: subprocess, shutil, socket, requests, urllib, httpx, aiohttp\n"
             "NEVER use: os.system(), os.popen(), os.exec*(), os.spawn*(), os.kill()\n"
@@ -45,10 +48,16 @@ def _load_repair_prompt() -> str:
             "- Fix ONLY the specific error — do not change anything else\n"
             "- If the error is a missing import, add an ALLOWED import at the top\n"
             "- If the error is a wrong variable name, fix just that variable\n\n"
+            "=== ORIGINAL CODE ===\n{broken_code}\n\n"
+            "=== ERROR MESSAGE ===\n{stderr}\n\n"
             "=== FIXED CODE ===\n"
         )
 
 
+# Loaded once at import — repair runs in a retry loop, no need to re-read.
+_PROMPT_TEMPLATE = _load_repair_prompt()
+
+
 def _extract_code(response_text: str) -> str:
     """Extract code from LLM response, stripping markdown fences if present."""
     text = response_text.strip()
@@ -74,8 +83,7 @@ async def repair_code(broken_code: str, stderr: str, llm) -> str:
     Returns:
         The fixed code string.
     """
-    template = _load_repair_prompt()
-    repair_prompt = template.format(broken_code=broken_code, stderr=stderr)
+    repair_prompt = _PROMPT_TEMPLATE.format(broken_code=broken_code, stderr=stderr)
 
     logger.info("[code_repair] Requesting fix for error: %s", stderr[:200])
 
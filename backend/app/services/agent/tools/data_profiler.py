@@ -1,7 +1,8 @@
 """Data profiler — automatically profiles CSV/XLSX/TSV datasets.
 
-Loads the first data file from workspace_files, runs pandas profiling,
-and stores the results in analysis_context for LLM use.
+Loads the first data file from workspace_files, profiles it (CSV/TSV on
+PyArrow columns, Excel via pandas), and stores the results in
+analysis_context for LLM use.
 
 Safety: limits rows loaded to prevent OOM on large files.
 """
@@ -10,7 +11,9 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from typing import Any, Dict, List, Optional
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
 from app.services.agent.state import AgentState
 
@@ -18,6 +21,11 @@ logger = logging.getLogger(__name__)
 
 _MAX_PROFILE_ROWS = 50_000  # Safety cap for large files
 
+# Profiles keyed on (path, mtime_ns, size) — an unchanged file is not
+# re-profiled on later chat turns. Bounded LRU.
+_PROFILE_CACHE_MAX = 64
+_profile_cache: OrderedDict[Tuple[str, int, int], Dict[str, Any]] = OrderedDict()
+
 
 def _find_data_file(workspace_files: List[Dict]) -> Optional[Dict]:
     """Find the first CSV, TSV, or XLSX file in workspace_files."""
@@ -28,23 +36,88 @@ def _find_data_file(workspace_files: List[Dict]) -> Optional[Dict]:
     return None
 
 
-def _profile_sync(file_path: str, ext: str) -> Dict[str, Any]:
-    """Synchronous pandas profiling (runs in thread pool).
-    
-    Caps rows at _MAX_PROFILE_ROWS to prevent OOM on large files.
+def _read_csv_arrow(file_path: str, delimiter: str):
+    """Read up to _MAX_PROFILE_ROWS rows with PyArrow's multi-threaded CSV reader.
+
+    Streams record batches so files far above the cap are never fully parsed.
     """
-    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    reader = pacsv.open_csv(
+        file_path,
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=1 << 20),
+        parse_options=pacsv.ParseOptions(delimiter=delimiter),
+        # Empty string cells count as nulls, matching pandas' read_csv.
+        convert_options=pacsv.ConvertOptions(strings_can_be_null=True),
+    )
+    batches = []
+    rows = 0
+    for batch in reader:
+        batches.append(batch)
+        rows += batch.num_rows
+        if rows >= _MAX_PROFILE_ROWS:
+            break
+    table = pa.Table.from_batches(batches, schema=reader.schema)
+    return table.slice(0, _MAX_PROFILE_ROWS)
+
+
+def _describe_arrow_column(col) -> Dict[str, Any]:
+    """pandas-``describe``-style stats for one Arrow column via pyarrow.compute.
+
+    Numeric columns get count/mean/std/min/quartiles/max; everything else
+    gets count/unique/top/freq — the same keys ``describe(include="all")``
+    fills in for each kind.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    count = len(col) - col.null_count
+    if pa.types.is_integer(col.type) or pa.types.is_floating(col.type):
+        min_max = pc.min_max(col)
+        q25, q50, q75 = pc.quantile(col, q=[0.25, 0.5, 0.75]).to_pylist() if count else (None,) * 3
+        return {
+            "count": count,
+            "mean": pc.mean(col).as_py(),
+            "std": pc.stddev(col, ddof=1).as_py(),
+            "min": min_max["min"].as_py(),
+            "25%": q25,
+            "50%": q50,
+            "75%": q75,
+            "max": min_max["max"].as_py(),
+        }
+
+    # One hash pass yields unique, top and freq (pc.mode has no string kernel).
+    value_counts = pc.value_counts(col.drop_null())
+    stats: Dict[str, Any] = {"count": count, "unique": len(value_counts)}
+    if len(value_counts):
+        counts = value_counts.field("counts")
+        top_idx = pc.index(counts, pc.max(counts)).as_py()
+        stats["top"] = value_counts.field("values")[top_idx].as_py()
+        stats["freq"] = counts[top_idx].as_py()
+    return stats
+
+
+def _profile_arrow(table) -> Dict[str, Any]:
+    """Profile an Arrow table in one pass per column, without pandas scans."""
+    # Zero-row conversion yields the pandas dtype names the LLM prompts expect.
+    pandas_dtypes = table.schema.empty_table().to_pandas().dtypes
+    return {
+        "shape": [table.num_rows, table.num_columns],
+        "columns": table.column_names,
+        "dtypes": {col: str(dtype) for col, dtype in pandas_dtypes.items()},
+        "describe": {
+            name: _describe_arrow_column(col)
+            for name, col in zip(table.column_names, table.columns)
+        },
+        "null_counts": {name: col.null_count for name, col in zip(table.column_names, table.columns)},
+        "sample_rows": table.slice(0, 3).to_pylist(),
+    }
 
-    if ext == ".csv":
-        df = pd.read_csv(file_path, nrows=_MAX_PROFILE_ROWS)
-    elif ext == ".tsv":
-        df = pd.read_csv(file_path, sep="\t", nrows=_MAX_PROFILE_ROWS)
-    else:
-        df = pd.read_excel(file_path, nrows=_MAX_PROFILE_ROWS)
-    
-    truncated = len(df) >= _MAX_PROFILE_ROWS
 
-    profile = {
+def _profile_pandas(df) -> Dict[str, Any]:
+    """Profile a pandas DataFrame (Excel and CSVs PyArrow cannot parse)."""
+    return {
         "shape": list(df.shape),
         "columns": df.columns.tolist(),
         "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
@@ -52,23 +125,65 @@ def _profile_sync(file_path: str, ext: str) -> Dict[str, Any]:
         "null_counts": df.isnull().sum().to_dict(),
         "sample_rows": df.head(3).to_dict(orient="records"),
     }
-    if truncated:
+
+
+def _profile_sync(file_path: str, ext: str) -> Dict[str, Any]:
+    """Synchronous dataset profiling (runs in thread pool).
+    
+    CSV/TSV are read and profiled on Arrow columns directly; files PyArrow
+    rejects (ragged rows, odd quoting) and Excel workbooks use pandas.
+    Caps rows at _MAX_PROFILE_ROWS to prevent OOM on large files.
+    """
+    import pandas as pd
+
+    if ext in (".csv", ".tsv"):
+        sep = "\t" if ext == ".tsv" else ","
+        try:
+            profile = _profile_arrow(_read_csv_arrow(file_path, sep))
+        except Exception as exc:
+            logger.info("[data_profiler] PyArrow CSV read failed (%s) — using pandas", exc)
+            profile = _profile_pandas(pd.read_csv(file_path, sep=sep, nrows=_MAX_PROFILE_ROWS))
+    else:
+        profile = _profile_pandas(pd.read_excel(file_path, nrows=_MAX_PROFILE_ROWS))
+
+    if profile["shape"][0] >= _MAX_PROFILE_ROWS:
         profile["truncated"] = True
         profile["max_rows_loaded"] = _MAX_PROFILE_ROWS
     
     return profile
 
 
+def _profile_cached(file_path: str, ext: str) -> Dict[str, Any]:
+    """``_profile_sync`` memoized on the file's identity (path, mtime, size).
+
+    Returns a shallow copy so callers may annotate the profile freely.
+    """
+    st = os.stat(file_path)
+    key = (file_path, st.st_mtime_ns, st.st_size)
+    cached = _profile_cache.get(key)
+    if cached is not None:
+        _profile_cache.move_to_end(key)
+        logger.info("[data_profiler] Profile cache hit for %s", file_path)
+        return dict(cached)
+
+    profile = _profile_sync(file_path, ext)
+    _profile_cache[key] = profile
+    while len(_profile_cache) > _PROFILE_CACHE_MAX:
+        _profile_cache.popitem(last=False)
+    return dict(profile)
+
+
 async def profile_dataset(state: AgentState) -> AgentState:
     """Profile the first CSV/XLSX file in workspace_files.
 
-    Stores profiling results in state["analysis_context"].
+    Returns profiling results under ``analysis_context`` as a partial update
+    (LangGraph merges it into state).
 
     Args:
         state: Agent state with workspace_files populated.
 
     Returns:
-        Updated state with analysis_context filled.
+        State delta containing only ``analysis_context``.
     """
     workspace_files = state.get("workspace_files", [])
     data_file = _find_data_file(workspace_files)
@@ -76,7 +191,6 @@ async def profile_dataset(state: AgentState) -> AgentState:
     if data_file is None:
         logger.warning("[data_profiler] No CSV/XLSX file found in workspace_files")
         return {
-            **state,
             "analysis_context": {
                 "error": "No data file found in uploaded materials",
             },
@@ -89,7 +203,7 @@ async def profile_dataset(state: AgentState) -> AgentState:
     logger.info("[data_profiler] Profiling %s (%s)", filename, file_path)
 
     try:
-        profile = await asyncio.to_thread(_profile_sync, file_path, ext)
+        profile = await asyncio.to_thread(_profile_cached, file_path, ext)
         profile["filename"] = filename
         profile["file_path"] = file_path
 
@@ -99,15 +213,11 @@ async def profile_dataset(state: AgentState) -> AgentState:
             profile["shape"][1],
         )
 
-        return {
-            **state,
-            "analysis_context": profile,
-        }
+        return {"analysis_context": profile}
 
     except Exception as exc:
         logger.error("[data_profiler] Profiling failed: %s", exc)
         return {
-            **state,
             "analysis_context": {
                 "error": f"Failed to profile {filename}: {str(exc)}",
                 "filename": filename,
@@ -1,7 +1,8 @@
 """File generator — executes AI-generated code to produce files.
 
 Orchestrates workspace header injection, code execution in sandbox,
-and detection of FILE_SAVED: markers to track generated files.
+and detection of FILE_SAVED: markers (parsed live from the stdout stream)
+to track generated files.
 """
 
 from __future__ import annotations
@@ -17,6 +18,23 @@ from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Extension → frontend file-type badge.
+_TYPE_MAP: Dict[str, str] = {
+    ".csv": "spreadsheet",
+    ".xlsx": "spreadsheet",
+    ".xls": "spreadsheet",
+    ".docx": "document",
+    ".doc": "document",
+    ".pdf": "document",
+    ".png": "image",
+    ".jpg": "image",
+    ".jpeg": "image",
+    ".svg": "image",
+    ".html": "web",
+    ".json": "data",
+    ".txt": "text",
+}
+
 
 def _format_size(size_bytes: int) -> str:
     """Format bytes as human-readable size string."""
@@ -30,23 +48,7 @@ def _format_size(size_bytes: int) -> str:
 
 def _detect_file_type(filename: str) -> str:
     """Detect file type from extension."""
-    ext = os.path.splitext(filename)[1].lower()
-    type_map = {
-        ".csv": "spreadsheet",
-        ".xlsx": "spreadsheet",
-        ".xls": "spreadsheet",
-        ".docx": "document",
-        ".doc": "document",
-        ".pdf": "document",
-        ".png": "image",
-        ".jpg": "image",
-        ".jpeg": "image",
-        ".svg": "image",
-        ".html": "web",
-        ".json": "data",
-        ".txt": "text",
-    }
-    return type_map.get(ext, "file")
+    return _TYPE_MAP.get(os.path.splitext(filename)[1].lower(), "file")
 
 
 async def generate_file(
@@ -81,12 +83,44 @@ async def generate_file(
 
     logger.info("[file_generator] Executing code (%d chars) for file generation", len(full_code))
 
-    # Track stdout lines for FILE_SAVED detection
-    stdout_lines: List[str] = []
     generated_files: List[Dict[str, Any]] = list(state.get("generated_files", []))
+    new_files: List[Dict[str, Any]] = []
 
     async def on_stdout_line(line: str):
-        stdout_lines.append(line)
+        # FILE_SAVED: markers are resolved as they stream in, so file_ready
+        # fires as soon as each file exists rather than after the run ends.
+        prefix, marker, file_path = line.partition("FILE_SAVED:")
+        if not marker or prefix.strip():
+            return
+        file_path = file_path.strip()
+        try:
+            file_size = os.stat(file_path).st_size
+        except OSError:
+            return
+        filename = os.path.basename(file_path)
+        file_info = {
+            "filename": filename,
+            "path": file_path,
+            "download_url": f"/agent/download/{user_id}/{session_id}/{filename}",
+            "size": file_size,
+            "size_human": _format_size(file_size),
+            "type": _detect_file_type(filename),
+        }
+        new_files.append(file_info)
+        generated_files.append(file_info)
+
+        # Notify via stream callback
+        if stream_cb:
+            try:
+                await stream_cb("file_ready", file_info)
+            except Exception as exc:
+                logger.warning("[file_generator] stream_cb failed: %s", exc)
+
+        logger.info(
+            "[file_generator] File saved: %s (%s)",
+            filename,
+            file_info["size_human"],
+        )
 
     # Execute in sandbox
     result = await execute_code(
@@ -95,44 +129,7 @@ async def generate_file(
         timeout=settings.CODE_EXECUTION_TIMEOUT,
         on_stdout_line=on_stdout_line,
     )
-
-    # Parse FILE_SAVED: markers from stdout
     full_stdout = result.get("stdout", "")
-    new_files: List[Dict[str, Any]] = []
-
-    for line in full_stdout.split("\n"):
-        line = line.strip()
-        if line.startswith("FILE_SAVED:"):
-            file_path = line[len("FILE_SAVED:"):].strip()
-            if os.path.exists(file_path):
-                filename = os.path.basename(file_path)
-                file_size = os.path.getsize(file_path)
-                file_type = _detect_file_type(filename)
-                download_url = f"/agent/download/{user_id}/{session_id}/{filename}"
-
-                file_info = {
-                    "filename": filename,
-                    "path": file_path,
-                    "download_url": download_url,
-                    "size": file_size,
-                    "size_human": _format_size(file_size),
-                    "type": file_type,
-                }
-                new_files.append(file_info)
-                generated_files.append(file_info)
-
-                # Notify via stream callback
-                if stream_cb:
-                    try:
-                        await stream_cb("file_ready", file_info)
-                    except Exception as exc:
-                        logger.warning("[file_generator] stream_cb failed: %s", exc)
-
-                logger.info(
-                    "[file_generator] File saved: %s (%s)",
-                    filename,
-                    _format_size(file_size),
-                )
 
     success = result.get("success", False)
     stderr = result.get("stderr", "")
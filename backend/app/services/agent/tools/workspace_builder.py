@@ -8,24 +8,83 @@ from __future__ import annotations
 
 import os
 import re
-from typing import Dict, List
+from collections import defaultdict
+from functools import lru_cache
+from typing import DefaultDict, Dict, List, Tuple
 
 from app.core.config import settings
 from app.services.agent.state import AgentState
 
 
+class _NonIdentTable(dict):
+    """``str.translate`` table mapping every char outside ``[A-Za-z0-9_]`` to ``_``.
+
+    Filled lazily per code point, so non-ASCII names behave like the old
+    ``[^a-zA-Z0-9_]`` regex without a 1.1M-entry table.
+    """
+
+    def __missing__(self, codepoint: int) -> str:
+        ch = chr(codepoint)
+        value = ch if (ch.isascii() and (ch.isalnum() or ch == "_")) else "_"
+        self[codepoint] = value
+        return value
+
+
+_XLATE = _NonIdentTable()
+# One pass: drop a leading digit run, collapse underscore runs to one "_"
+# (the unmatched group in the first alternative substitutes as "").
+_RE_CLEAN = re.compile(r"^[0-9]+|(_)+")
+
+
+@lru_cache(maxsize=1024)
 def _safe_varname(filename: str) -> str:
     """Convert a filename into a valid Python variable name."""
-    name = os.path.splitext(filename)[0]
+    # os.path.splitext for a bare filename: a dot only splits off an
+    # extension if something other than dots precedes it (".env" stays).
+    stem, dot, _ = filename.rpartition(".")
+    name = stem if dot and stem.strip(".") else filename
     # Replace non-alphanumeric chars with underscore
-    name = re.sub(r"[^a-zA-Z0-9_]", "_", name)
-    # Remove leading digits
-    name = re.sub(r"^[0-9]+", "", name)
-    # Collapse multiple underscores
-    name = re.sub(r"_+", "_", name).strip("_")
+    name = name.translate(_XLATE)
+    # Remove leading digits, collapse multiple underscores
+    name = _RE_CLEAN.sub(r"\1", name).strip("_")
     return name.lower() or "file"
 
 
+# Invariant part of the header — identical for every call.
+_STATIC_PREAMBLE = "\n".join([
+    "# ── Auto-generated workspace header ──",
+    "import os",
+    "import pandas as pd",
+    "import numpy as np",
+    "import matplotlib",
+    "matplotlib.use('Agg')",
+    "import matplotlib.pyplot as plt",
+    "import json, csv",
+    "",
+    "# Output directory (absolute path — pre-created by runtime)",
+    "",
+])
+
+# Per-file header lines, one template per file kind.
+_CSV_TMPL = '%s_path = "%s"  # load with pd.read_csv()'
+_EXCEL_TMPL = '%s_path = "%s"  # load with pd.read_excel()'
+_TEXT_TMPL = '%s_text_path = "%s"  # load with open().read()'
+_PATH_TMPL = '%s_path = "%s"'
+_TEXT_PATH_TMPL = '%s_text_path = "%s"'
+
+# Extension → (template, fills from text_path?). Unlisted extensions fall
+# through to the generic real/text path pair.
+_KIND_TMPLS: Dict[str, Tuple[str, bool]] = {
+    ".csv": (_CSV_TMPL, False),
+    ".xlsx": (_EXCEL_TMPL, False),
+    ".xls": (_EXCEL_TMPL, False),
+    ".pdf": (_TEXT_TMPL, True),
+    ".docx": (_TEXT_TMPL, True),
+    ".txt": (_TEXT_TMPL, True),
+    ".md": (_TEXT_TMPL, True),
+}
+
+
 def build_workspace_header(state: AgentState) -> str:
     """Build a Python code header with imports and file path variables.
 
@@ -35,12 +94,27 @@ def build_workspace_header(state: AgentState) -> str:
     Returns:
         Multi-line Python string to prepend to generated code.
     """
-    user_id = state.get("user_id", "default")
-    session_id = state.get("session_id", "default")
+    workspace_files: List[Dict] = state.get("workspace_files", [])
+    # Only these fields shape the header, so they key the render cache.
+    files_key = tuple(
+        (f.get("filename", "unknown"), f.get("real_path", ""), f.get("text_path", ""), f.get("ext", ""))
+        for f in workspace_files
+    )
+    return _render_header(
+        state.get("user_id", "default"), state.get("session_id", "default"), files_key,
+    )
 
+
+# Agent turns in one session rebuild the header from an unchanged file list.
+@lru_cache(maxsize=256)
+def _render_header(
+    user_id: str, session_id: str, files_key: Tuple[Tuple[str, str, str, str], ...],
+) -> str:
+    """Render the header for ``build_workspace_header`` (cached per input)."""
     # Sanitize path components to prevent directory traversal
-    safe_user_id = os.path.basename(user_id)
-    safe_session_id = os.path.basename(session_id)
+    # (rpartition on "/" is os.path.basename on POSIX, minus the call overhead)
+    safe_user_id = user_id.rpartition("/")[2]
+    safe_session_id = session_id.rpartition("/")[2]
 
     # Use ABSOLUTE path so FILE_SAVED markers resolve correctly
     # and file writes go to the correct location regardless of cwd.
@@ -48,53 +122,34 @@ def build_workspace_header(state: AgentState) -> str:
         settings.GENERATED_OUTPUT_DIR, safe_user_id, safe_session_id
     )
 
-    lines: List[str] = [
-        "# ── Auto-generated workspace header ──",
-        "import os",
-        "import pandas as pd",
-        "import numpy as np",
-        "import matplotlib",
-        "matplotlib.use('Agg')",
-        "import matplotlib.pyplot as plt",
-        "import json, csv",
-        "",
-        "# Output directory (absolute path — pre-created by runtime)",
-        f'OUTPUT_DIR = "{output_dir}"',
-        "",
-    ]
-
-    workspace_files: List[Dict] = state.get("workspace_files", [])
-
-    if workspace_files:
-        lines.append("# ── Uploaded file paths ──")
-        seen_vars: Dict[str, int] = {}
-
-        for f in workspace_files:
-            filename = f.get("filename", "unknown")
-            real_path = f.get("real_path", "")
-            text_path = f.get("text_path", "")
-            ext = f.get("ext", "").lower()
-
-            base_var = _safe_varname(filename)
-            # Handle duplicate variable names
-            if base_var in seen_vars:
-                seen_vars[base_var] += 1
-                base_var = f"{base_var}_{seen_vars[base_var]}"
-            else:
-                seen_vars[base_var] = 0
-
-            if ext in (".csv", ".xlsx", ".xls"):
-                load_hint = "pd.read_csv()" if ext == ".csv" else "pd.read_excel()"
-                lines.append(f'{base_var}_path = "{real_path}"  # load with {load_hint}')
-            elif ext in (".pdf", ".docx", ".txt", ".md"):
-                lines.append(f'{base_var}_text_path = "{text_path}"  # load with open().read()')
-            else:
-                # Generic file reference
-                if real_path:
-                    lines.append(f'{base_var}_path = "{real_path}"')
-                if text_path:
-                    lines.append(f'{base_var}_text_path = "{text_path}"')
-
-        lines.append("")
-
-    return "\n".join(lines)
+    head = f'{_STATIC_PREAMBLE}OUTPUT_DIR = "{output_dir}"\n'
+
+    if not files_key:
+        return head
+
+    lines: List[str] = ["# ── Uploaded file paths ──"]
+    append = lines.append
+    seen_vars: DefaultDict[str, int] = defaultdict(int)
+
+    for filename, real_path, text_path, ext in files_key:
+        ext = ext.lower()
+
+        base_var = _safe_varname(filename)
+        # Handle duplicate variable names
+        dup = seen_vars[base_var]
+        seen_vars[base_var] = dup + 1
+        if dup:
+            base_var = "%s_%d" % (base_var, dup)
+
+        kind = _KIND_TMPLS.get(ext)
+        if kind is not None:
+            tmpl, from_text = kind
+            append(tmpl % (base_var, text_path if from_text else real_path))
+        else:
+            # Generic file reference
+            if real_path:
+                append(_PATH_TMPL % (base_var, real_path))
+            if text_path:
+                append(_TEXT_PATH_TMPL % (base_var, text_path))
+
+    return f"{head}\n" + "\n".join(lines) + "\n"
@@ -22,12 +22,25 @@ Registered tools
 from __future__ import annotations
 
 import asyncio
+import csv
+import io
+import json
 import logging
+import os
+import threading
 import time
+from functools import lru_cache
 from typing import Any, Callable, Coroutine, Dict, List
 
 from app.core.config import settings
 from app.services.agent.state import ToolResult
+from app.services.code_execution.executor import generate_and_execute
+from app.services.llm_service.llm import get_llm
+
+try:
+    from langchain_core.callbacks import adispatch_custom_event as _ADISPATCH
+except ImportError:  # older langchain_core without custom events
+    _ADISPATCH = None
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +48,9 @@ logger = logging.getLogger(__name__)
 # ── Tool Registry ─────────────────────────────────────────────
 
 _TOOLS: Dict[str, Dict[str, Any]] = {}
+# Reverse index intent → tool entries, maintained by register_tool.
+_INTENT_INDEX: Dict[str, List[Dict[str, Any]]] = {}
+_REGISTRY_LOCK = threading.Lock()
 
 
 def register_tool(
@@ -44,13 +60,21 @@ def register_tool(
     intents: List[str],
 ):
     """Register a tool in the registry."""
-    _TOOLS[name] = {
+    entry = {
         "name": name,
         "description": description,
         "handler": handler,
         "intents": intents,
     }
-    logger.info(f"Registered tool: {name}")
+    with _REGISTRY_LOCK:
+        previous = _TOOLS.get(name)
+        if previous is not None:
+            for intent in previous["intents"]:
+                _INTENT_INDEX[intent] = [t for t in _INTENT_INDEX[intent] if t is not previous]
+        _TOOLS[name] = entry
+        for intent in intents:
+            _INTENT_INDEX.setdefault(intent, []).append(entry)
+    logger.info("Registered tool: %s", name)
 
 
 def get_tool(name: str) -> Dict[str, Any] | None:
@@ -60,7 +84,7 @@ def get_tool(name: str) -> Dict[str, Any] | None:
 
 def get_tools_for_intent(intent: str) -> List[Dict[str, Any]]:
     """Get all tools that handle a given intent."""
-    return [t for t in _TOOLS.values() if intent in t["intents"]]
+    return list(_INTENT_INDEX.get(intent, ()))
 
 
 def list_tools() -> List[str]:
@@ -71,6 +95,30 @@ def list_tools() -> List[str]:
 # ── Built-in Tool Implementations ─────────────────────────────
 
 
+def _error_result(
+    tool_name: str, output: str, exc: Exception, t0: float | None = None,
+) -> ToolResult:
+    """Log a handler failure and build its failed ToolResult.
+
+    ``t0`` is the handler's ``perf_counter`` start time, if it tracks one.
+    """
+    if t0 is None:
+        logger.error("[%s] FAILED | error=%s", tool_name, exc)
+    else:
+        logger.error(
+            "[%s] FAILED | elapsed=%.2fs | error=%s",
+            tool_name, time.perf_counter() - t0, exc,
+        )
+    return ToolResult(
+        tool_name=tool_name,
+        success=False,
+        output=output,
+        metadata={},
+        error=str(exc),
+        tokens_used=0,
+    )
+
+
 async def rag_tool(
     user_id: str,
     query: str,
@@ -80,7 +128,7 @@ async def rag_tool(
     **kwargs,
 ) -> ToolResult:
     """RAG retrieval + LLM answer — wraps the secure retriever and chat service."""
-    t0 = time.time()
+    t0 = time.perf_counter()
     logger.info(
         "[rag_tool] START | user=%s | materials=%s | query=%r",
         user_id, material_ids, query[:80],
@@ -119,7 +167,7 @@ async def rag_tool(
             user_message=query,
             session_id=session_id,
         )
-        elapsed = time.time() - t0
+        elapsed = time.perf_counter() - t0
         logger.info(
             "[rag_tool] OK | elapsed=%.2fs | answer_len=%d | context_len=%d",
             elapsed, len(answer), len(context),
@@ -129,20 +177,11 @@ async def rag_tool(
             success=True,
             output=answer,
             metadata={"context_length": len(context)},
-            tokens_used=len(answer.split()) * 2,
+            tokens_used=len(answer) // 4,  # ~4 chars per token
         )
 
     except Exception as exc:
-        elapsed = time.time() - t0
-        logger.error("[rag_tool] FAILED | elapsed=%.2fs | error=%s", elapsed, exc)
-        return ToolResult(
-            tool_name="rag_tool",
-            success=False,
-            output="An error occurred while searching your materials.",
-            metadata={},
-            error=str(exc),
-            tokens_used=0,
-        )
+        return _error_result("rag_tool", "An error occurred while searching your materials.", exc, t0)
 
 
 async def quiz_tool(
@@ -152,7 +191,7 @@ async def quiz_tool(
     **kwargs,
 ) -> ToolResult:
     """Quiz generation — retrieves context then generates structured quiz questions."""
-    t0 = time.time()
+    t0 = time.perf_counter()
     logger.info(
         "[quiz_tool] START | user=%s | materials=%s", user_id, material_ids
     )
@@ -177,7 +216,7 @@ async def quiz_tool(
 
         questions = result.get("questions", [])
         title = result.get("title", "Quiz")
-        elapsed = time.time() - t0
+        elapsed = time.perf_counter() - t0
         logger.info(
             "[quiz_tool] OK | elapsed=%.2fs | questions=%d",
             elapsed, len(questions),
@@ -191,16 +230,7 @@ async def quiz_tool(
         )
 
     except Exception as exc:
-        elapsed = time.time() - t0
-        logger.error("[quiz_tool] FAILED | elapsed=%.2fs | error=%s", elapsed, exc)
-        return ToolResult(
-            tool_name="quiz_tool",
-            success=False,
-            output="Quiz generation failed.",
-            metadata={},
-            error=str(exc),
-            tokens_used=0,
-        )
+        return _error_result("quiz_tool", "Quiz generation failed.", exc, t0)
 
 
 async def flashcard_tool(
@@ -210,7 +240,7 @@ async def flashcard_tool(
     **kwargs,
 ) -> ToolResult:
     """Flashcard generation — retrieves context then generates study flashcards."""
-    t0 = time.time()
+    t0 = time.perf_counter()
     logger.info(
         "[flashcard_tool] START | user=%s | materials=%s", user_id, material_ids
     )
@@ -235,7 +265,7 @@ async def flashcard_tool(
 
         cards = result.get("flashcards", [])
         title = result.get("title", "Flashcards")
-        elapsed = time.time() - t0
+        elapsed = time.perf_counter() - t0
         logger.info(
             "[flashcard_tool] OK | elapsed=%.2fs | cards=%d",
             elapsed, len(cards),
@@ -249,16 +279,7 @@ async def flashcard_tool(
         )
 
     except Exception as exc:
-        elapsed = time.time() - t0
-        logger.error("[flashcard_tool] FAILED | elapsed=%.2fs | error=%s", elapsed, exc)
-        return ToolResult(
-            tool_name="flashcard_tool",
-            success=False,
-            output="Flashcard generation failed.",
-            metadata={},
-            error=str(exc),
-            tokens_used=0,
-        )
+        return _error_result("flashcard_tool", "Flashcard generation failed.", exc, t0)
 
 
 async def ppt_tool(
@@ -292,15 +313,80 @@ async def ppt_tool(
             tokens_used=0,
         )
     except Exception as exc:
-        logger.error("[ppt_tool] FAILED | error=%s", exc)
-        return ToolResult(
-            tool_name="ppt_tool",
-            success=False,
-            output="Presentation generation failed.",
-            metadata={},
-            error=str(exc),
-            tokens_used=0,
-        )
+        return _error_result("ppt_tool", "Presentation generation failed.", exc)
+
+
+# Live code_stdout events flush every N lines, or this many seconds after the
+# first unflushed line.
+_STDOUT_BATCH_LINES = 64
+_STDOUT_BATCH_SECONDS = 0.1
+
+# DATA_ANALYSIS explanations: stdout shorter than this (with no chart) gets a
+# canned explanation instead of an LLM call.
+_MIN_EXPLAIN_STDOUT_CHARS = 50
+
+
+@lru_cache(maxsize=2048)
+def _parse_meta_str(raw: str) -> dict:
+    """Parse a material's metadata JSON, memoized on the raw string.
+
+    The blob only changes when the material is re-processed, so identical
+    strings share one parse. Callers must treat the result as read-only.
+    """
+    return json.loads(raw)
+
+
+def _existing_files(paths: List[str]) -> set[str]:
+    """Return the subset of ``paths`` that are existing regular files.
+
+    Paths are grouped by directory and each directory is listed once with
+    ``os.scandir``, so N side-cars in one folder cost one syscall, not N stats.
+    """
+    by_dir: Dict[str, set[str]] = {}
+    for path in paths:
+        by_dir.setdefault(os.path.dirname(path), set()).add(path)
+
+    found: set[str] = set()
+    for directory, wanted in by_dir.items():
+        try:
+            with os.scandir(directory or ".") as it:
+                names = {entry.name for entry in it if entry.is_file()}
+        except OSError:
+            continue
+        found.update(p for p in wanted if os.path.basename(p) in names)
+    return found
+
+
+def _validate_parquet(pf: Dict[str, str]) -> bool:
+    """Schema-only check: reads just the parquet footer, no row groups."""
+    try:
+        from pyarrow.parquet import ParquetFile
+        ParquetFile(pf["path"]).schema_arrow
+        return True
+    except Exception as val_err:
+        logger.warning("[python_tool] Skipping unreadable parquet %s: %s", pf["name"], val_err)
+        return False
+
+
+def _validate_csv(cf: Dict[str, str]) -> bool:
+    """Header-only check: the first non-blank row must parse and name a column.
+
+    Weaker than the ``pd.read_csv(nrows=0)`` it replaces (csv.reader accepts
+    almost any text), but rejects the same empty / header-less files.
+    Single-column files stay valid, as they were under pandas.
+    """
+    try:
+        for header in csv.reader(io.StringIO(cf["content"][:4096])):
+            if header:  # csv.reader yields [] for blank lines, which pandas skips
+                break
+        else:
+            raise ValueError("empty file")
+        if not any(field.strip() for field in header):
+            raise ValueError("no header row")
+        return True
+    except Exception as val_err:  # ValueError above, csv.Error
+        logger.warning("[python_tool] Skipping unreadable CSV %s: %s", cf["filename"], str(val_err) or "empty file")
+        return False
 
 
 async def python_tool(
@@ -319,20 +405,18 @@ async def python_tool(
       2. Validates the code against security rules
       3. Runs it in an isolated subprocess with a timeout
     """
-    t0 = time.time()
+    t0 = time.perf_counter()
     logger.info("[python_tool] START | query=%r", query[:80])
     try:
-        from app.services.code_execution.executor import generate_and_execute
+        # Kept lazy: material_service pulls in the embedding/storage stack.
         from app.services.material_service import get_material_for_user, get_material_text
-        import json
-        from app.services.llm_service.llm import get_llm
 
         # Emit code_generating event so the frontend shows "Generating code…"
-        try:
-            from langchain_core.callbacks import adispatch_custom_event
-            await adispatch_custom_event("code_generating", {"tool": "python_tool", "status": "generating"})
-        except Exception:
-            pass
+        if _ADISPATCH is not None:
+            try:
+                await _ADISPATCH("code_generating", {"tool": "python_tool", "status": "generating"})
+            except Exception:
+                pass
 
         # ── Incorporate previous RAG context if tool chaining (DATA_ANALYSIS) ──
         previous_context = kwargs.get("previous_context", "")
@@ -341,28 +425,43 @@ async def python_tool(
         parquet_files: list[dict[str, str]] = []  # {"name": "sales.parquet", "path": "/abs/path.parquet"}
 
         if material_ids and user_id:
-            for m_id in material_ids:
-                material = await get_material_for_user(m_id, user_id)
+            # One DB round-trip per material, issued concurrently.
+            materials = await asyncio.gather(
+                *(get_material_for_user(m_id, user_id) for m_id in material_ids)
+            )
+            parsed: list[tuple[str, str, dict]] = []  # (material_id, filename, meta)
+            side_cars: list[str] = []
+            for m_id, material in zip(material_ids, materials):
                 if not material:
                     continue
                 fname = getattr(material, "filename", "") or ""
-                fname_lower = fname.lower()
 
                 # Parse stored extraction metadata for parquet side-car paths
                 meta_raw = getattr(material, "metadata", None)
                 meta: dict = {}
                 if meta_raw:
                     try:
-                        meta = json.loads(meta_raw) if isinstance(meta_raw, str) else meta_raw
+                        meta = _parse_meta_str(meta_raw) if isinstance(meta_raw, str) else meta_raw
                     except (json.JSONDecodeError, TypeError):
                         pass
+                parsed.append((m_id, fname, meta))
 
-                import os
+                sdp = meta.get("structured_data_paths")
+                if sdp and isinstance(sdp, dict):
+                    side_cars.extend(p for p in sdp.values() if p and isinstance(p, str))
+                elif isinstance(sdp_single := meta.get("structured_data_path"), str):
+                    side_cars.append(sdp_single)
+
+            # One directory listing per side-car directory instead of a stat per file
+            existing = _existing_files(side_cars)
+
+            legacy_csv: list[tuple[str, str]] = []  # (material_id, filename)
+            for m_id, fname, meta in parsed:
                 # Excel: structured_data_paths is {sheet_name: path}
                 sdp = meta.get("structured_data_paths")
                 if sdp and isinstance(sdp, dict):
                     for sheet_name, ppath in sdp.items():
-                        if ppath and os.path.isfile(ppath):
+                        if ppath in existing:
                             safe = fname.rsplit(".", 1)[0] if "." in fname else fname
                             display = f"{safe}_{sheet_name}.parquet"
                             parquet_files.append({"name": display, "path": ppath})
@@ -370,43 +469,65 @@ async def python_tool(
 
                 # CSV: structured_data_path is a string
                 sdp_single = meta.get("structured_data_path")
-                if sdp_single and isinstance(sdp_single, str) and os.path.isfile(sdp_single):
+                if sdp_single and isinstance(sdp_single, str) and sdp_single in existing:
                     display = fname.rsplit(".", 1)[0] + ".parquet" if "." in fname else fname + ".parquet"
                     parquet_files.append({"name": display, "path": sdp_single})
                     continue
 
                 # Legacy fallback: pass raw CSV text for files without parquet
-                if fname_lower.endswith(".csv"):
-                    text = await get_material_text(m_id, user_id)
-                    if text:
-                        csv_files.append({"filename": fname, "content": text})
+                if fname.lower().endswith(".csv"):
+                    legacy_csv.append((m_id, fname))
 
-        async def on_stdout(line: str):
+            if legacy_csv:
+                texts = await asyncio.gather(
+                    *(get_material_text(m_id, user_id) for m_id, _ in legacy_csv)
+                )
+                csv_files = [
+                    {"filename": fname, "content": text}
+                    for (_, fname), text in zip(legacy_csv, texts)
+                    if text
+                ]
+
+        # Live stdout is batched so a chatty script costs one event per
+        # batch rather than one event-bus round-trip per line. A timer task
+        # flushes a partial batch, so a line printed before a long silent
+        # computation still reaches the client within the interval.
+        stdout_batch: list[str] = []
+        flush_task: asyncio.Task | None = None
+
+        async def flush_stdout():
+            if not stdout_batch:
+                return
+            lines = stdout_batch[:]
+            stdout_batch.clear()
             try:
-                from langchain_core.callbacks import adispatch_custom_event
-                await adispatch_custom_event("code_stdout", {"line": line})
-            except ImportError:
-                # Fallback if langchain_core is older or not configured for custom events
+                await _ADISPATCH("code_stdout", {"lines": lines})
+            except Exception:
                 pass
 
+        async def flush_later():
+            nonlocal flush_task
+            await asyncio.sleep(_STDOUT_BATCH_SECONDS)
+            flush_task = None
+            await flush_stdout()
+
+        async def on_stdout(line: str):
+            nonlocal flush_task
+            if _ADISPATCH is None:
+                return
+            stdout_batch.append(line)
+            if len(stdout_batch) >= _STDOUT_BATCH_LINES:
+                await flush_stdout()
+            elif flush_task is None:
+                flush_task = asyncio.create_task(flush_later())
+
         # ── Pre-validate data files before executing ────────────────
-        validated_parquet = []
-        for pf in parquet_files:
-            try:
-                import pandas as _pd
-                _pd.read_parquet(pf["path"], columns=None).head(0)  # schema-only read
-                validated_parquet.append(pf)
-            except Exception as val_err:
-                logger.warning("[python_tool] Skipping unreadable parquet %s: %s", pf["name"], val_err)
-
-        validated_csv = []
-        for cf in csv_files:
-            try:
-                import io as _io, pandas as _pd
-                _pd.read_csv(_io.StringIO(cf["content"]), nrows=0)
-                validated_csv.append(cf)
-            except Exception as val_err:
-                logger.warning("[python_tool] Skipping unreadable CSV %s: %s", cf["filename"], val_err)
+        # Footer reads hit disk — run them concurrently off the event loop.
+        parquet_ok = await asyncio.gather(
+            *(asyncio.to_thread(_validate_parquet, pf) for pf in parquet_files)
+        )
+        validated_parquet = [pf for pf, ok in zip(parquet_files, parquet_ok) if ok]
+        validated_csv = [cf for cf in csv_files if _validate_csv(cf)]
 
         if not validated_parquet and not validated_csv and material_ids:
             return ToolResult(
@@ -421,28 +542,39 @@ async def python_tool(
 
         # Callback for when code generation is complete — emit the generated code immediately
         async def on_code_generated(code: str):
+            if _ADISPATCH is None:
+                return
             try:
-                from langchain_core.callbacks import adispatch_custom_event
-                await adispatch_custom_event("code_generated", {"code": code})
+                await _ADISPATCH("code_generated", {"code": code})
             except Exception:
                 pass
 
-        result = await generate_and_execute(
-            user_query=query,
-            csv_files=validated_csv,
-            parquet_files=validated_parquet,
-            timeout=15,
-            on_stdout_line=on_stdout,
-            additional_context=previous_context,
-            on_code_generated=on_code_generated,
-        )
+        try:
+            result = await generate_and_execute(
+                user_query=query,
+                csv_files=validated_csv,
+                parquet_files=validated_parquet,
+                timeout=15,
+                on_stdout_line=on_stdout,
+                additional_context=previous_context,
+                on_code_generated=on_code_generated,
+            )
+        finally:
+            if flush_task is not None:
+                flush_task.cancel()
+            if _ADISPATCH is not None:
+                await flush_stdout()
 
-        elapsed = time.time() - t0
+        elapsed = time.perf_counter() - t0
         success: bool = result.get("success", False)
 
         if intent == "DATA_ANALYSIS":
             explanation = ""
-            if success:
+            stdout = result.get("stdout") or ""
+            if success and len(stdout.strip()) < _MIN_EXPLAIN_STDOUT_CHARS and not result.get("chart_base64"):
+                # Nothing worth an LLM round-trip to explain
+                explanation = "Analysis completed."
+            elif success:
                 llm = get_llm(mode="chat")  # factual explanation
                 prompt = (
                     "Analyze this output and provide a well-structured, professional summary of the findings.\n\n"
@@ -451,13 +583,13 @@ async def python_tool(
                     "- **Key Findings** as a bullet list with bold labels for each point\n"
                     "- A brief **Strategic Implications** paragraph at the end\n\n"
                     "Use line breaks between sections for readability. Keep it concise but insightful.\n\n"
-                    f"Query: {query}\n\nOutput:\n{result.get('stdout', '')}"
+                    f"Query: {query}\n\nOutput:\n{stdout}"
                 )
                 try:
                     resp = await llm.ainvoke(prompt)
                     explanation = getattr(resp, "content", str(resp)).strip()
                 except Exception as e:
-                    logger.warning(f"Failed to generate explanation: {e}")
+                    logger.warning("Failed to generate explanation: %s", e)
                     explanation = "Analysis completed successfully."
             else:
                 explanation = "Execution failed. Please check the error details."
@@ -471,26 +603,35 @@ async def python_tool(
             output = json.dumps(output_data)
         else:
             # Build human-readable answer string
-            parts: list[str] = []
+            # Written straight into one buffer so large code/stdout blocks are
+            # copied once, not once per f-string and again by a final join.
+            buf = io.StringIO()
+
+            def section(*chunks: str) -> None:
+                if buf.tell():
+                    buf.write("\n\n")
+                for chunk in chunks:
+                    buf.write(chunk)
+
             if result.get("generated_code"):
-                parts.append(f"```python\n{result['generated_code']}\n```")
+                section("```python\n", result["generated_code"], "\n```")
             if success:
                 if result.get("stdout"):
-                    parts.append(f"**Output:**\n```\n{result['stdout'].rstrip()}\n```")
+                    section("**Output:**\n```\n", result["stdout"].rstrip(), "\n```")
                 if result.get("chart_base64"):
-                    parts.append("📊 *Chart generated successfully.*")
+                    section("📊 *Chart generated successfully.*")
             else:
                 if result.get("violations"):
-                    parts.append(
-                        "⚠️ **Security violation:**\n"
-                        + "\n".join(f"- {v}" for v in result["violations"])
+                    section(
+                        "⚠️ **Security violation:**\n",
+                        "\n".join(f"- {v}" for v in result["violations"]),
                     )
                 elif result.get("stderr"):
-                    parts.append(f"**Error:**\n```\n{result['stderr'].rstrip()}\n```")
+                    section("**Error:**\n```\n", result["stderr"].rstrip(), "\n```")
                 elif result.get("error"):
-                    parts.append(f"**Error:** {result['error']}")
+                    section("**Error:** ", str(result["error"]))
 
-            output = "\n\n".join(parts) if parts else "Code execution completed with no output."
+            output = buf.getvalue() if buf.tell() else "Code execution completed with no output."
 
         logger.info(
             "[python_tool] %s | elapsed=%.2fs | exit_code=%s",
@@ -515,16 +656,7 @@ async def python_tool(
         )
 
     except Exception as exc:
-        elapsed = time.time() - t0
-        logger.error("[python_tool] FAILED | elapsed=%.2fs | error=%s", elapsed, exc)
-        return ToolResult(
-            tool_name="python_tool",
-            success=False,
-            output="Python execution failed.",
-            metadata={},
-            error=str(exc),
-            tokens_used=0,
-        )
+        return _error_result("python_tool", "Python execution failed.", exc, t0)
 
 
 async def research_tool(
@@ -535,28 +667,24 @@ async def research_tool(
     **kwargs,
 ) -> ToolResult:
     """Deep research — multi-source web research with structured report."""
-    t0 = time.time()
+    t0 = time.perf_counter()
     logger.info("[research_tool] START | user=%s | query=%r", user_id, query[:80])
     try:
         from app.services.agent.subgraphs.research_graph import run_research
 
-        result = await run_research(
+        ok, report_json = await run_research(
             user_query=query,
             user_id=user_id,
             notebook_id=notebook_id,
             material_ids=material_ids,
         )
 
-        elapsed = time.time() - t0
+        elapsed = time.perf_counter() - t0
 
-        if result.startswith('{"executive_summary": "Failed'):
-            # It's our graceful failure JSON
+        if not ok:
+            # Graceful failure report — still returned so the UI can show why
             logger.warning("[research_tool] Graceful failure structure returned")
 
-        # result is now a JSON string containing the final report
-
-
-        report_json: str = result
         logger.info(
             "[research_tool] OK | elapsed=%.2fs | report_len=%d",
             elapsed, len(report_json),
@@ -572,16 +700,7 @@ async def research_tool(
         )
 
     except Exception as exc:
-        elapsed = time.time() - t0
-        logger.error("[research_tool] FAILED | elapsed=%.2fs | error=%s", elapsed, exc)
-        return ToolResult(
-            tool_name="research_tool",
-            success=False,
-            output="Research execution failed.",
-            metadata={},
-            error=str(exc),
-            tokens_used=0,
-        )
+        return _error_result("research_tool", "Research execution failed.", exc, t0)
 
 
 # ── Register All Tools ────────────────────────────────────────
@@ -631,7 +750,7 @@ def initialize_tools():
         intents=["RESEARCH"],
     )
 
-    logger.info(f"Initialized {len(_TOOLS)} tools: {list_tools()}")
+    logger.info("Initialized %d tools: %s", len(_TOOLS), list_tools())
 
 
 # Lazy initialization — called on first graph build, NOT on module import.
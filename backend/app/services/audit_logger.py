@@ -9,18 +9,107 @@ Logged fields:
 - token counts
 - model used
 - latencies (LLM, retrieval, total)
+
+Rows are queued in-process and written by a background flusher with one
+``create_many`` per batch, so the request path never waits on the insert.
+The flusher is started/stopped from the app lifespan; without it (scripts,
+tests) rows are written directly.
 """
 
 from __future__ import annotations
 
+import asyncio
 import logging
+import uuid
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from app.db.prisma_client import prisma
 
 logger = logging.getLogger(__name__)
 
+_LOG_QUEUE_MAX = 10_000     # bounded — a stalled DB backpressures callers
+_FLUSH_BATCH_SIZE = 100     # max rows per create_many
+_FLUSH_INTERVAL = 5.0       # seconds a partial batch may wait for more rows
+
+# Endpoints whose calls are persisted. Anything else (health checks, token
+# refresh, file serving) is dropped before it reaches the queue; add a path
+# here when wiring log_api_usage into a new billable route.
+_AUDITED_ENDPOINTS: frozenset[str] = frozenset({"/chat"})
+
+# Shared value for rows without materials (the common non-RAG case); rows
+# are only serialized, never mutated.
+_NO_MATERIAL_IDS: List[str] = []
+
+_log_queue: asyncio.Queue[Dict[str, Any]] = asyncio.Queue(maxsize=_LOG_QUEUE_MAX)
+_flush_task: asyncio.Task | None = None
+
+
+async def _write_batch(batch: List[Dict[str, Any]]) -> None:
+    """Insert a batch of usage rows; failures are logged, never raised."""
+    if not batch:
+        return
+    try:
+        # create_many: one INSERT without create()'s read-back of each row.
+        # Rows carry their id from log_api_usage, so skip_duplicates turns a
+        # re-written batch (see the flusher's shutdown path) into a no-op.
+        await prisma.apiusagelog.create_many(data=batch, skip_duplicates=True)
+        logger.debug("API usage flushed: %d rows", len(batch))
+    except Exception as e:
+        logger.error(f"Failed to flush {len(batch)} API usage rows: {e}")
+
+
+async def _flusher() -> None:
+    """Drain the queue forever, writing up to _FLUSH_BATCH_SIZE rows per insert."""
+    loop = asyncio.get_running_loop()
+    batch: List[Dict[str, Any]] = []
+    try:
+        while True:
+            batch = [await _log_queue.get()]
+            deadline = loop.time() + _FLUSH_INTERVAL
+            while len(batch) < _FLUSH_BATCH_SIZE:
+                if not _log_queue.empty():
+                    batch.append(_log_queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(_log_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await _write_batch(batch)
+            batch = []
+    except asyncio.CancelledError:
+        # Shutdown — persist the in-flight batch plus anything still queued
+        while not _log_queue.empty():
+            batch.append(_log_queue.get_nowait())
+        for i in range(0, len(batch), _FLUSH_BATCH_SIZE):
+            await _write_batch(batch[i:i + _FLUSH_BATCH_SIZE])
+        raise
+
+
+def start_audit_flusher() -> None:
+    """Start the background batch writer (called from the app lifespan)."""
+    global _flush_task
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.create_task(_flusher(), name="audit_log_flusher")
+        logger.info("Audit log flusher started.")
+
+
+async def stop_audit_flusher() -> None:
+    """Stop the batch writer after flushing queued rows (before DB disconnect)."""
+    global _flush_task
+    if _flush_task is None:
+        return
+    _flush_task.cancel()
+    try:
+        await _flush_task
+    except asyncio.CancelledError:
+        pass
+    _flush_task = None
+    logger.info("Audit log flusher stopped.")
+
 
 async def log_api_usage(
     user_id: str,
@@ -33,7 +122,7 @@ async def log_api_usage(
     retrieval_latency: float = 0.0,
     total_latency: float = 0.0,
 ) -> None:
-    """Log API usage to database.
+    """Queue API usage for the batched database writer.
     
     Args:
         user_id: User identifier
@@ -46,48 +135,68 @@ async def log_api_usage(
         retrieval_latency: Retrieval time (seconds)
         total_latency: Total request time (seconds)
     """
+    if endpoint not in _AUDITED_ENDPOINTS:
+        return
     if not user_id:
         logger.warning("Cannot log API usage without user_id")
         return
     
+    row = {
+        # Assigned here, not by the DB default, so a batch written twice
+        # conflicts on the primary key instead of inserting duplicates.
+        "id": str(uuid.uuid4()),
+        "userId": user_id,
+        "endpoint": endpoint,
+        "materialIds": material_ids if material_ids is not None else _NO_MATERIAL_IDS,
+        "contextTokenCount": context_token_count,
+        "responseTokenCount": response_token_count,
+        "modelUsed": model_used,
+        "llmLatency": llm_latency,
+        "retrievalLatency": retrieval_latency,
+        "totalLatency": total_latency,
+    }
+
+    if _flush_task is None or _flush_task.done():
+        # No flusher running — write synchronously
+        await _write_batch([row])
+        return
+
     try:
-        await prisma.apiusagelog.create(
-            data={
-                "userId": user_id,
-                "endpoint": endpoint,
-                "materialIds": material_ids or [],
-                "contextTokenCount": context_token_count,
-                "responseTokenCount": response_token_count,
-                "modelUsed": model_used,
-                "llmLatency": llm_latency,
-                "retrievalLatency": retrieval_latency,
-                "totalLatency": total_latency,
-            }
-        )
-        
-        logger.debug(
-            f"API usage logged: user={user_id}, endpoint={endpoint}, "
-            f"tokens={context_token_count + response_token_count}"
-        )
-        
-    except Exception as e:
-        logger.error(f"Failed to log API usage: {e}")
-        # Don't raise - logging is non-critical
+        _log_queue.put_nowait(row)
+    except asyncio.QueueFull:
+        # Backpressure: wait for the flusher to make room
+        await _log_queue.put(row)
+
+    logger.debug(
+        f"API usage queued: user={user_id}, endpoint={endpoint}, "
+        f"tokens={context_token_count + response_token_count}"
+    )
 
 
 async def get_user_api_usage(
     user_id: str,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    limit: int = 100
+    limit: int = 100,
+    after_created_at: Optional[datetime] = None,
+    after_id: Optional[str] = None,
 ) -> list:
-    """Get user's API usage history.
+    """Get user's API usage history, newest first.
+    
+    Pages with a keyset cursor rather than an offset: pass the last
+    returned record's ``createdAt`` and ``id`` as ``after_created_at`` /
+    ``after_id`` to fetch the next (older) page. Rows are ordered by
+    (createdAt, id), so rows sharing a timestamp — common with batched
+    inserts — are never skipped at a page boundary. Each page is an index
+    range scan on (userId, createdAt DESC, id DESC), however deep it is.
     
     Args:
         user_id: User identifier
         start_date: Start date filter
         end_date: End date filter
         limit: Maximum records to return
+        after_created_at: Cursor timestamp — the last record of the previous page
+        after_id: Cursor id — the last record of the previous page
     
     Returns:
         List of usage records
@@ -101,10 +210,21 @@ async def get_user_api_usage(
                 where["createdAt"]["gte"] = start_date
             if end_date:
                 where["createdAt"]["lte"] = end_date
+
+        if after_created_at:
+            # (createdAt, id) < (c, last_id)
+            older = {"createdAt": {"lt": after_created_at}}
+            if after_id:
+                where["OR"] = [
+                    older,
+                    {"createdAt": after_created_at, "id": {"lt": after_id}},
+                ]
+            else:
+                where["AND"] = [older]
         
         records = await prisma.apiusagelog.find_many(
             where=where,
-            order={"createdAt": "desc"},
+            order=[{"createdAt": "desc"}, {"id": "desc"}],
             take=limit,
         )
         
@@ -131,53 +251,45 @@ async def get_usage_statistics(
         Dict with statistics
     """
     try:
-        # Use aggregation via raw SQL instead of loading all records into memory
-        # to prevent OOM on large datasets
-        where_clauses = []
-        params = []
-        param_idx = 1
-        
+        # Aggregate in the database instead of loading all records into memory
+        # to prevent OOM on large datasets: one row back, whatever the user
+        # count. Only SUM + COUNT are computed — averages are derived here.
+        conditions: List[str] = []
+        params: List[Any] = []
         if user_id:
-            where_clauses.append(f'"userId" = ${param_idx}')
             params.append(user_id)
-            param_idx += 1
+            conditions.append(f'"user_id" = ${len(params)}::uuid')
+        # created_at is a UTC timestamp without time zone, hence AT TIME ZONE.
         if start_date:
-            where_clauses.append(f'"createdAt" >= ${param_idx}')
-            params.append(start_date)
-            param_idx += 1
+            params.append(start_date.isoformat())
+            conditions.append(f"\"created_at\" >= (${len(params)}::timestamptz AT TIME ZONE 'UTC')")
         if end_date:
-            where_clauses.append(f'"createdAt" <= ${param_idx}')
-            params.append(end_date)
-            param_idx += 1
-        
-        where_sql = (" WHERE " + " AND ".join(where_clauses)) if where_clauses else ""
-        
-        result = await prisma.query_raw(
-            f'SELECT COUNT(*) as total_requests, '
-            f'COALESCE(SUM("contextTokenCount" + "responseTokenCount"), 0) as total_tokens, '
-            f'COALESCE(AVG("llmLatency"), 0) as avg_llm_latency, '
-            f'COALESCE(AVG("retrievalLatency"), 0) as avg_retrieval_latency, '
-            f'COALESCE(AVG("totalLatency"), 0) as avg_total_latency '
-            f'FROM "ApiUsageLog"{where_sql}',
+            params.append(end_date.isoformat())
+            conditions.append(f"\"created_at\" <= (${len(params)}::timestamptz AT TIME ZONE 'UTC')")
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        rows = await prisma.query_raw(
+            'SELECT count(*) AS "requests", '
+            'COALESCE(sum("context_token_count"), 0) AS "context_tokens", '
+            'COALESCE(sum("response_token_count"), 0) AS "response_tokens", '
+            'COALESCE(sum("llm_latency"), 0) AS "llm_latency", '
+            'COALESCE(sum("retrieval_latency"), 0) AS "retrieval_latency", '
+            'COALESCE(sum("total_latency"), 0) AS "total_latency" '
+            f'FROM "api_usage_logs"{where}',
             *params,
         )
-        
-        if not result:
-            return {
-                "total_requests": 0,
-                "total_tokens": 0,
-                "avg_llm_latency": 0.0,
-                "avg_retrieval_latency": 0.0,
-                "avg_total_latency": 0.0,
-            }
-        
-        row = result[0]
+        totals = rows[0]
+        total_requests = int(totals["requests"])
+
+        def _avg(field: str) -> float:
+            return float(totals[field]) / total_requests if total_requests else 0.0
+
         return {
-            "total_requests": int(row.get("total_requests", 0)),
-            "total_tokens": int(row.get("total_tokens", 0)),
-            "avg_llm_latency": float(row.get("avg_llm_latency", 0)),
-            "avg_retrieval_latency": float(row.get("avg_retrieval_latency", 0)),
-            "avg_total_latency": float(row.get("avg_total_latency", 0)),
+            "total_requests": total_requests,
+            "total_tokens": int(totals["context_tokens"]) + int(totals["response_tokens"]),
+            "avg_llm_latency": _avg("llm_latency"),
+            "avg_retrieval_latency": _avg("retrieval_latency"),
+            "avg_total_latency": _avg("total_latency"),
         }
         
     except Exception as e:
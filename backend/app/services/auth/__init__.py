@@ -1,11 +1,14 @@
 from app.services.auth.security import (
     hash_password,
+    hash_password_async,
     verify_password,
+    verify_password_async,
     create_access_token,
     create_refresh_token,
     create_file_token,
     decode_token,
     hash_token,
+    legacy_hash_token,
 )
 from app.services.auth.service import (
     register_user,
@@ -1,64 +1,178 @@
+import asyncio
 import hashlib
+import logging
+import os
+import time
 import uuid
-from passlib.context import CryptContext
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
 from jose import jwt, JWTError
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+# Token parameters are fixed for the process lifetime — resolve them once.
+_SECRET = settings.JWT_SECRET_KEY
+_ALGORITHM = settings.JWT_ALGORITHM
+_ALGORITHMS = [_ALGORITHM]
+_ACCESS_DELTA = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+_REFRESH_DELTA = timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+_FILE_DELTA = timedelta(minutes=settings.FILE_TOKEN_EXPIRE_MINUTES)
+
+# bcrypt only reads the first 72 bytes of a password; passlib truncated the
+# same way, so hashes it produced keep verifying.
+_BCRYPT_MAX_BYTES = 72
+_BCRYPT_ROUNDS = settings.BCRYPT_ROUNDS
+# Acceptable single-hash time: long enough to resist offline guessing, short
+# enough that concurrent logins don't queue behind the login CPU budget.
+_HASH_TARGET_MS = (150.0, 600.0)
 
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    """Hash with bcrypt directly (same ``$2b$`` format passlib produced).
+
+    CPU-bound for ~100 ms — call from a worker thread in async code.
+    """
+    return bcrypt.hashpw(
+        password.encode()[:_BCRYPT_MAX_BYTES], bcrypt.gensalt(rounds=_BCRYPT_ROUNDS)
+    ).decode()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    """Check a password against a stored bcrypt hash (blocking, see above)."""
+    try:
+        return bcrypt.checkpw(
+            plain_password.encode()[:_BCRYPT_MAX_BYTES], hashed_password.encode()
+        )
+    except ValueError:  # malformed stored hash
+        return False
+
+
+# bcrypt releases the GIL while hashing, so threads already spread logins
+# across cores. A dedicated pool keeps a login storm from starving the
+# default executor every other to_thread/run_in_executor call shares.
+_HASH_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="pwhash")
+
+
+async def hash_password_async(password: str) -> str:
+    """``hash_password`` on the dedicated hashing pool."""
+    return await asyncio.get_running_loop().run_in_executor(_HASH_POOL, hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """``verify_password`` on the dedicated hashing pool."""
+    return await asyncio.get_running_loop().run_in_executor(
+        _HASH_POOL, verify_password, plain_password, hashed_password
+    )
+
+
+# Exercise the bcrypt extension once at import (minimum cost factor, ~1 ms)
+# so the first login after a deploy doesn't pay any first-call setup.
+try:
+    bcrypt.checkpw(b"warmup", bcrypt.hashpw(b"warmup", bcrypt.gensalt(rounds=4)))
+except Exception:  # warm-up must never break import
+    pass
+
+
+def check_password_hash_cost() -> float:
+    """Time one production-cost hash and log if it is outside the target band.
+
+    Blocking — run in a worker thread at startup. Returns the elapsed ms.
+    """
+    t0 = time.perf_counter()
+    hash_password("cost-check")
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    low, high = _HASH_TARGET_MS
+    if not low <= elapsed_ms <= high:
+        logger.warning(
+            "bcrypt rounds=%d took %.0f ms (target %.0f–%.0f ms) — adjust BCRYPT_ROUNDS",
+            _BCRYPT_ROUNDS, elapsed_ms, low, high,
+        )
+    else:
+        logger.info("bcrypt rounds=%d: %.0f ms per hash", _BCRYPT_ROUNDS, elapsed_ms)
+    return elapsed_ms
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + (
-        expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
-    to_encode.update({"exp": expire, "type": "access", "jti": str(uuid.uuid4())})
-    return jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    expire = datetime.now(timezone.utc) + (expires_delta or _ACCESS_DELTA)
+    to_encode.update({"exp": expire, "type": "access", "jti": uuid.uuid4().hex})
+    return jwt.encode(to_encode, _SECRET, algorithm=_ALGORITHM)
 
 
 def create_refresh_token(data: dict, family: Optional[str] = None) -> str:
     """Create a refresh token with an optional family ID for rotation tracking."""
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    expire = datetime.now(timezone.utc) + _REFRESH_DELTA
     to_encode.update({
         "exp": expire,
         "type": "refresh",
         "family": family or data.get("sub", ""),
-        "jti": str(uuid.uuid4()),
+        "jti": uuid.uuid4().hex,
     })
-    return jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    return jwt.encode(to_encode, _SECRET, algorithm=_ALGORITHM)
 
 
 def create_file_token(user_id: str, expires_minutes: int = None) -> str:
     """Create a short-lived token for authenticated file access (query param)."""
-    expire = datetime.now(timezone.utc) + timedelta(
-        minutes=expires_minutes or settings.FILE_TOKEN_EXPIRE_MINUTES
-    )
-    to_encode = {"sub": user_id, "exp": expire, "type": "file"}
-    return jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    delta = timedelta(minutes=expires_minutes) if expires_minutes else _FILE_DELTA
+    to_encode = {"sub": user_id, "exp": datetime.now(timezone.utc) + delta, "type": "file"}
+    return jwt.encode(to_encode, _SECRET, algorithm=_ALGORITHM)
+
+
+# Short-lived cache of verified payloads keyed by the raw token. One request
+# decodes the same bearer token several times (rate limiter, auth dependency),
+# and clients reuse it across requests. Invalid tokens are cached as None.
+_DECODE_CACHE_TTL = 5.0  # seconds
+_DECODE_CACHE_MAX = 10_000
+_decode_cache: "OrderedDict[str, tuple[float, Optional[dict]]]" = OrderedDict()
 
 
 def decode_token(token: str) -> Optional[dict]:
-    try:
-        payload = jwt.decode(
-            token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM]
-        )
+    """Verify and decode a JWT. Callers must treat the payload as read-only."""
+    now = time.monotonic()
+    cached = _decode_cache.get(token)
+    if cached is not None and now - cached[0] < _DECODE_CACHE_TTL:
+        payload = cached[1]
+        # Never serve a token past its own expiry from the cache
+        exp = payload.get("exp") if payload is not None else None
+        if exp is not None and exp <= time.time():
+            return None
         return payload
+
+    try:
+        payload = jwt.decode(token, _SECRET, algorithms=_ALGORITHMS)
     except JWTError:
-        return None
+        payload = None
+
+    _decode_cache[token] = (now, payload)
+    _decode_cache.move_to_end(token)
+    if len(_decode_cache) > _DECODE_CACHE_MAX:
+        _decode_cache.popitem(last=False)
+    return payload
+
+
+# BLAKE2b accepts at most a 64-byte key.
+_TOKEN_HASH_KEY = _SECRET.encode()[:64]
 
 
 def hash_token(token: str) -> str:
-    """Hash a token for storage (for refresh token rotation tracking)."""
+    """Hash a token for storage (for refresh token rotation tracking).
+
+    Keyed BLAKE2b-128: the JWT signature already authenticates the token, so
+    this is only a lookup fingerprint — shorter and cheaper than SHA-256.
+    """
+    return hashlib.blake2b(token.encode(), digest_size=16, key=_TOKEN_HASH_KEY).hexdigest()
+
+
+def legacy_hash_token(token: str) -> str:
+    """SHA-256 fingerprint used before BLAKE2b, still matched during rotation.
+
+    Can be dropped once REFRESH_TOKEN_EXPIRE_DAYS have passed since the switch.
+    """
     return hashlib.sha256(token.encode()).hexdigest()
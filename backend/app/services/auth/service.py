@@ -1,22 +1,43 @@
 import logging
 import uuid
 from fastapi import Depends, HTTPException, Request, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.security import HTTPBearer
 from typing import Optional
 from datetime import datetime, timedelta, timezone
 
 from app.db.prisma_client import prisma
 from app.services.auth.security import (
-    hash_password,
-    verify_password,
+    hash_password_async,
+    verify_password_async,
     decode_token,
     hash_token,
+    legacy_hash_token,
 )
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
-security = HTTPBearer(auto_error=False)
+
+class _BearerToken(HTTPBearer):
+    """``HTTPBearer`` that hands back the raw token string.
+
+    Subclassing keeps the bearer scheme in the OpenAPI schema (the docs UI's
+    "Authorize" flow); ``__call__`` is a plain header parse — same
+    case-insensitive scheme check, without the credentials object on every
+    request. Missing or malformed headers yield ``None``.
+    """
+
+    async def __call__(self, request: Request) -> Optional[str]:
+        header = request.headers.get("authorization")
+        if not header:
+            return None
+        scheme, _, token = header.partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+        return token
+
+
+bearer_token = _BearerToken(auto_error=False)
 
 
 async def register_user(email: str, username: str, password: str):
@@ -32,7 +53,7 @@ async def register_user(email: str, username: str, password: str):
         data={
             "email": email,
             "username": username,
-            "hashedPassword": hash_password(password),
+            "hashedPassword": await hash_password_async(password),
         }
     )
     return user
@@ -43,7 +64,8 @@ async def authenticate_user(email: str, password: str):
 
     if not user:
         return None
-    if not verify_password(password, user.hashedPassword):
+    # bcrypt is deliberately slow — keep it off the event loop
+    if not await verify_password_async(password, user.hashedPassword):
         return None
     return user
 
@@ -53,16 +75,15 @@ async def get_user_by_id(user_id: str):
 
 
 async def get_current_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    token: Optional[str] = Depends(bearer_token),
 ):
     """Extract and validate user from Bearer token in Authorization header."""
-    if credentials is None:
+    if token is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Not authenticated",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    token = credentials.credentials
     payload = decode_token(token)
 
     if payload is None:
@@ -115,10 +136,14 @@ async def validate_file_token(token: str) -> Optional[str]:
 # ── Refresh Token Rotation ─────────────────────────────────
 
 
+# Fixed for the process lifetime, like the token settings in security.py.
+_REFRESH_TTL = timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+
+
 async def store_refresh_token(user_id: str, token: str, family: str) -> None:
     """Store a hashed refresh token in the database."""
     token_hash = hash_token(token)
-    expires_at = datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    expires_at = datetime.now(timezone.utc) + _REFRESH_TTL
 
     await prisma.refreshtoken.create(
         data={
@@ -143,10 +168,24 @@ async def validate_and_rotate_refresh_token(token: str) -> Optional[dict]:
 
     user_id = payload.get("sub")
     family = payload.get("family", user_id)
-    token_hash = hash_token(token)
+    # Tokens stored before the BLAKE2b switch carry a SHA-256 hash; match both.
+    token_hashes = [hash_token(token), legacy_hash_token(token)]
+
+    # Atomic compare-and-swap: mark the token used only if it is still unused
+    # and unexpired. A returned row means this caller won the rotation.
+    # expires_at is a UTC timestamp without time zone, hence AT TIME ZONE.
+    rotated = await prisma.query_raw(
+        'UPDATE "refresh_tokens" SET "used" = true '
+        'WHERE "token_hash" IN ($1, $2) AND "used" = false '
+        "AND \"expires_at\" > (now() AT TIME ZONE 'UTC') "
+        'RETURNING "id"',
+        *token_hashes,
+    )
+    if rotated:
+        return {"user_id": user_id, "family": family}
 
-    # Find the token in DB
-    stored = await prisma.refreshtoken.find_unique(where={"tokenHash": token_hash})
+    # CAS lost — one lookup to tell replay from expiry from unknown token
+    stored = await prisma.refreshtoken.find_first(where={"tokenHash": {"in": token_hashes}})
 
     if not stored:
         # Token not found — might be stolen or never stored
@@ -159,25 +198,8 @@ async def validate_and_rotate_refresh_token(token: str) -> Optional[dict]:
         await revoke_token_family(family)
         return None
 
-    if stored.expiresAt < datetime.now(timezone.utc):
-        logger.info(f"Refresh token expired for user {user_id}")
-        return None
-
-    # Mark old token as used - using find_first with used=False to avoid race conditions
-    updated = await prisma.refreshtoken.update_many(
-        where={
-            "id": stored.id,
-            "used": False
-        },
-        data={"used": True},
-    )
-    
-    if updated == 0:
-        # If updated is 0, it means someone else marked it as used in the meantime
-        logger.warning(f"Refresh token was already rotated for user {user_id}")
-        return None
-
-    return {"user_id": user_id, "family": family}
+    logger.info(f"Refresh token expired for user {user_id}")
+    return None
 
 
 async def revoke_token_family(family: str) -> None:
@@ -190,9 +212,27 @@ async def revoke_user_tokens(user_id: str) -> None:
     await prisma.refreshtoken.delete_many(where={"userId": user_id})
 
 
+_CLEANUP_BATCH = 10_000
+
+
 async def cleanup_expired_tokens() -> int:
-    """Remove expired tokens from DB. Returns count deleted."""
-    result = await prisma.refreshtoken.delete_many(
-        where={"expiresAt": {"lt": datetime.now(timezone.utc)}}
-    )
-    return result
+    """Remove expired tokens from DB in bounded batches. Returns count deleted.
+
+    Each batch locks at most ``_CLEANUP_BATCH`` rows (skipping rows a live
+    refresh holds), so a large purge never blocks writers for long.
+    """
+    total = 0
+    while True:
+        rows = await prisma.query_raw(
+            'WITH victims AS ('
+            'SELECT "id" FROM "refresh_tokens" '
+            "WHERE \"expires_at\" < (now() AT TIME ZONE 'UTC') "
+            'LIMIT $1 FOR UPDATE SKIP LOCKED'
+            ') '
+            'DELETE FROM "refresh_tokens" WHERE "id" IN (SELECT "id" FROM victims) '
+            'RETURNING "id"',
+            _CLEANUP_BATCH,
+        )
+        total += len(rows)
+        if len(rows) < _CLEANUP_BATCH:
+            return total
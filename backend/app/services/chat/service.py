@@ -1,14 +1,19 @@
 """In-memory chat session manager with citation validation.
 
-NOTE: Sessions live in process memory and are lost on restart.
-For production, consider backing sessions with Redis or the DB.
+Messages and sessions are stored in Postgres; recent history and session
+lists are cached in process memory (see "Read cache" below).
 """
 
 from __future__ import annotations
 
+import asyncio
+import io
 import logging
 import re
 import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
 from typing import AsyncIterator, Dict, List
 
 from app.services.llm_service.llm import get_llm
@@ -18,23 +23,39 @@ from app.services.rag.context_formatter import build_citation_correction_prompt
 
 logger = logging.getLogger(__name__)
 
+# Compiled once — these run on every RAG answer.
+_SOURCE_NUM_RE = re.compile(r'\[SOURCE\s+(\d+)\]')
+_CITATION_RE = re.compile(r'\[SOURCE\s+\d+\]')
+
+# Tags the RAG answer's LLM run; run_agent_stream forwards that run's stream
+# events as SSE tokens.
+RAG_ANSWER_TAG = "rag_answer"
+
+# Citation validation is a few regex passes over the answer — microseconds
+# for a typical reply, less than a thread hop. Very long answers are
+# validated in a worker thread so the event loop isn't held.
+_VALIDATE_IN_THREAD_CHARS = 50_000
+
+
 def _count_sources_in_context(context: str) -> int:
     """Count how many [SOURCE N] markers are in the formatted context."""
-    pattern = r'\[SOURCE\s+(\d+)\]'
-    matches = re.findall(pattern, context)
-    if not matches:
-        return 0
-    # Return the highest source number found
-    return max(int(n) for n in matches)
+    # Return the highest source number found — running max, no match list
+    best = 0
+    for m in _SOURCE_NUM_RE.finditer(context):
+        n = int(m.group(1))
+        if n > best:
+            best = n
+    return best
 
 
-async def generate_rag_response(
+async def stream_rag_response(
     notebook_id: str, user_id: str, context: str, user_message: str, session_id: str = None
-) -> str:
-    """Generate RAG response using DB history and citation validation."""
-    # Count sources
-    num_sources = _count_sources_in_context(context)
-    
+) -> AsyncIterator[str]:
+    """Yield the RAG answer's raw LLM deltas (history-aware prompt).
+
+    The model run is tagged ``RAG_ANSWER_TAG``, so inside the agent graph its
+    own ``astream_events`` stream events carry the tokens to the client.
+    """
     # Get history from DB
     raw_history = await get_chat_history(notebook_id, user_id, session_id)
     history_lines = []
@@ -45,48 +66,58 @@ async def generate_rag_response(
     formatted_history = "\n".join(history_lines) if history_lines else "None"
     
     prompt = get_chat_prompt(context, formatted_history, user_message)
-    llm = get_llm()
-    
-    from langchain_core.callbacks import adispatch_custom_event
+    llm = get_llm().with_config(tags=[RAG_ANSWER_TAG])
 
-    full_response = []
     async for chunk in llm.astream(prompt):
         content = getattr(chunk, "content", str(chunk))
         if content:
-            full_response.append(content)
-            try:
-                await adispatch_custom_event("rag_token", {"content": content})
-            except Exception:
-                pass
-            
-    answer = "".join(full_response).strip()
-    
+            yield content
+
+
+async def finalize_rag_response(full_text: str, num_sources: int) -> str:
+    """Validate citations in a complete answer, stripping out-of-range ones."""
+    answer = full_text.strip()
+
     # Citation Validation — strip invalid citations from the response
     if num_sources > 0:
-        validation = validate_citations(
-            response=answer,
-            num_sources=num_sources,
-            strict=True,
-        )
+        if len(answer) >= _VALIDATE_IN_THREAD_CHARS:
+            validation = await asyncio.to_thread(
+                validate_citations, response=answer, num_sources=num_sources, strict=True,
+            )
+        else:
+            validation = validate_citations(
+                response=answer,
+                num_sources=num_sources,
+                strict=True,
+            )
         if not validation["is_valid"]:
             logger.warning(f"RAG response validation failed: {validation['error_message']}")
             # Remove hallucinated source references that cite out-of-range numbers
-            import re as _citation_re
             invalid = validation.get("invalid_sources", [])
             if invalid:
-                for inv_src in invalid:
-                    answer = _citation_re.sub(
-                        rf'\[SOURCE\s+{inv_src}\]', '', answer
-                    )
-                answer = answer.strip()
+                invalid_re = re.compile(
+                    r'\[SOURCE\s+(?:' + '|'.join(map(str, invalid)) + r')\]'
+                )
+                answer = invalid_re.sub('', answer).strip()
             
     return answer
 
 
-# ── Confidence scoring ────────────────────────────────────────
+async def generate_rag_response(
+    notebook_id: str, user_id: str, context: str, user_message: str, session_id: str = None
+) -> str:
+    """Generate RAG response using DB history and citation validation."""
+    full_response = io.StringIO()
+    async for content in stream_rag_response(
+        notebook_id, user_id, context, user_message, session_id
+    ):
+        full_response.write(content)
+    return await finalize_rag_response(
+        full_response.getvalue(), _count_sources_in_context(context)
+    )
 
 
-import re as _re
+# ── Confidence scoring ────────────────────────────────────────
 
 
 def compute_confidence_score(
@@ -102,7 +133,7 @@ def compute_confidence_score(
         scores.append(max(0.0, min(1.0, (avg + 5) / 10)))
 
     if answer:
-        citations = _re.findall(r'\[SOURCE\s+\d+\]', answer)
+        citations = _CITATION_RE.findall(answer)
         word_count = len(answer.split())
         if word_count > 0:
             density = (len(citations) / word_count) * 100
@@ -111,6 +142,48 @@ def compute_confidence_score(
     return round(sum(scores) / len(scores), 2) if scores else 0.5
 
 
+# ── Read cache ───────────────────────────────────────────────
+
+# History and session lists are re-read on every chat turn and sidebar
+# refresh but change only through the writers below, which invalidate the
+# owner's entries. In-process like the user cache in auth/service.py — the
+# app runs as a single process and has no shared cache wired in.
+_CHAT_CACHE_TTL = 60.0  # seconds
+_CHAT_CACHE_MAX = 1_000
+# (user_id, notebook_id, session_id) → (stored_at, history)
+_history_cache: "OrderedDict[tuple, tuple[float, List[Dict]]]" = OrderedDict()
+# (user_id, notebook_id) → (stored_at, sessions)
+_sessions_cache: "OrderedDict[tuple, tuple[float, List[Dict]]]" = OrderedDict()
+
+
+def _cache_get(cache: OrderedDict, key: tuple):
+    cached = cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < _CHAT_CACHE_TTL:
+        return cached[1]
+    return None
+
+
+def _cache_put(cache: OrderedDict, key: tuple, value: List[Dict]) -> None:
+    cache[key] = (time.monotonic(), value)
+    cache.move_to_end(key)
+    if len(cache) > _CHAT_CACHE_MAX:
+        cache.popitem(last=False)
+
+
+def invalidate_chat_cache(user_id: str, notebook_id: str | None = None) -> None:
+    """Drop cached history and session lists for a user (optionally one notebook).
+
+    Call after any write to a user's chat messages, blocks or sessions.
+    """
+    for cache in (_history_cache, _sessions_cache):
+        stale = [
+            k for k in cache
+            if k[0] == user_id and (notebook_id is None or k[1] == notebook_id)
+        ]
+        for k in stale:
+            del cache[k]
+
+
 # ── DB persistence helpers ────────────────────────────────────
 
 
@@ -122,35 +195,46 @@ async def save_conversation(
     session_id: str = None,
     agent_meta: dict = None,
 ) -> str:
-    """Persist a user/assistant exchange.  Returns the assistant ChatMessage id."""
+    """Persist a user/assistant exchange.  Returns the assistant ChatMessage id.
+
+    Both rows are written in one transaction, so a turn is never stored
+    half-way (a user message without its answer or vice versa).
+    """
     import json as _json
     from app.db.prisma_client import prisma
 
-    assistant_msg_id = ""
+    rows = []
     for role, content in [("user", user_message), ("assistant", assistant_answer)]:
         if not content:
             continue
-        try:
-            data = {
-                "notebookId": notebook_id,
-                "userId": user_id,
-                "role": role,
-                "content": content,
-            }
-            if session_id:
-                data["chatSessionId"] = session_id
-            # Persist agentMeta on assistant messages so history can reload it
-            if role == "assistant" and agent_meta:
-                try:
-                    data["agentMeta"] = _json.dumps(agent_meta)
-                except Exception:
-                    pass
+        data = {
+            "notebookId": notebook_id,
+            "userId": user_id,
+            "role": role,
+            "content": content,
+        }
+        if session_id:
+            data["chatSessionId"] = session_id
+        # Persist agentMeta on assistant messages so history can reload it
+        if role == "assistant" and agent_meta:
+            try:
+                data["agentMeta"] = _json.dumps(agent_meta)
+            except Exception:
+                pass
+        rows.append(data)
 
-            msg = await prisma.chatmessage.create(data=data)
-            if role == "assistant":
-                assistant_msg_id = str(msg.id)
-        except Exception as exc:
-            logger.error("save_conversation failed (role=%s): %s", role, exc)
+    assistant_msg_id = ""
+    try:
+        async with prisma.tx() as tx:
+            for data in rows:
+                msg = await tx.chatmessage.create(data=data)
+                if data["role"] == "assistant":
+                    assistant_msg_id = str(msg.id)
+    except Exception as exc:
+        logger.error("save_conversation failed: %s", exc)
+        return ""
+    finally:
+        invalidate_chat_cache(user_id, notebook_id)
     return assistant_msg_id
 
 
@@ -283,30 +367,44 @@ def _split_markdown_blocks(content: str) -> List[str]:
     return blocks
 
 
-async def save_response_blocks(message_id: str, content: str) -> List[Dict]:
-    """Split *content* into markdown-aware blocks and persist each as a ResponseBlock."""
+async def save_response_blocks(
+    message_id: str,
+    content: str,
+    user_id: str = None,
+    notebook_id: str = None,
+) -> List[Dict]:
+    """Split *content* into markdown-aware blocks and persist each as a ResponseBlock.
+
+    All blocks go in with a single ``create_many``. IDs are generated here
+    rather than by the database so the inserted rows need no read-back.
+    Pass the owner's *user_id* / *notebook_id* to invalidate cached history.
+    """
     from app.db.prisma_client import prisma
 
-    created_blocks = []
-    blocks = _split_markdown_blocks(content)
-    for idx, block_text in enumerate(blocks):
-        try:
-            block = await prisma.responseblock.create(
-                data={
-                    "chatMessageId": message_id,
-                    "blockIndex": idx,
-                    "text": block_text[:5000],
-                }
-            )
-            created_blocks.append({
-                "id": str(block.id),
-                "index": block.blockIndex,
-                "text": block.text
-            })
-        except Exception as exc:
-            logger.debug("save_response_blocks failed (idx=%d): %s", idx, exc)
-    
-    return created_blocks
+    records = [
+        {
+            "id": str(uuid.uuid4()),
+            "chatMessageId": message_id,
+            "blockIndex": idx,
+            "text": block_text[:5000],
+        }
+        for idx, block_text in enumerate(_split_markdown_blocks(content))
+    ]
+    if not records:
+        return []
+    try:
+        await prisma.responseblock.create_many(data=records)
+    except Exception as exc:
+        logger.debug("save_response_blocks failed (%d blocks): %s", len(records), exc)
+        return []
+    if user_id:
+        # Blocks land after their message — drop history cached in between
+        invalidate_chat_cache(user_id, notebook_id)
+
+    return [
+        {"id": r["id"], "index": r["blockIndex"], "text": r["text"]}
+        for r in records
+    ]
 
 
 async def log_agent_execution(
@@ -336,10 +434,18 @@ async def log_agent_execution(
 
 
 async def get_chat_history(notebook_id: str, user_id: str, session_id: str = None) -> List[Dict]:
-    """Return serialised chat messages for *notebook_id* ordered oldest first."""
+    """Return serialised chat messages for *notebook_id* ordered oldest first.
+
+    Served from a short-lived cache; callers must treat the result as read-only.
+    """
     import json as _json
     from app.db.prisma_client import prisma
 
+    cache_key = (user_id, notebook_id, session_id)
+    cached = _cache_get(_history_cache, cache_key)
+    if cached is not None:
+        return cached
+
     try:
         where_clause = {"notebookId": notebook_id, "userId": user_id}
         if session_id:
@@ -371,6 +477,7 @@ async def get_chat_history(notebook_id: str, user_id: str, session_id: str = Non
                     key=lambda x: x["index"]
                 ) if m.role == "assistant" else []
             })
+        _cache_put(_history_cache, cache_key, result)
         return result
     except Exception as exc:
         logger.error("get_chat_history failed: %s", exc)
@@ -399,6 +506,8 @@ async def clear_chat_history(notebook_id: str, user_id: str, session_id: str = N
         await prisma.chatmessage.delete_many(where=where_clause)
     except Exception as exc:
         logger.error("clear_chat_history failed: %s", exc)
+    finally:
+        invalidate_chat_cache(user_id, notebook_id)
 
 
 # ── Chat sessions ───────────────────────────────────────
@@ -407,33 +516,55 @@ async def clear_chat_history(notebook_id: str, user_id: str, session_id: str = N
 async def get_chat_sessions(notebook_id: str, user_id: str) -> List[Dict]:
     """Return all chat sessions for a notebook.
     
-    Only loads message count and first message preview instead of full content
-    to avoid huge payloads for sessions with long conversations.
+    Only loads a short preview (first 3 messages, 200 chars each) instead of
+    full content to avoid huge payloads for sessions with long conversations.
+    The preview is assembled in Postgres, so one row per session comes back
+    rather than the sessions plus their messages. Served from a short-lived
+    cache; callers must treat the result as read-only.
     """
     from app.db.prisma_client import prisma
+
+    cache_key = (user_id, notebook_id)
+    cached = _cache_get(_sessions_cache, cache_key)
+    if cached is not None:
+        return cached
+
     try:
-        sessions = await prisma.chatsession.find_many(
-            where={"notebookId": notebook_id, "userId": user_id},
-            order={"createdAt": "desc"},
-            include={
-                "chatMessages": {
-                    "take": 3,  # Only first 3 messages for preview
-                    "order_by": {"createdAt": "asc"},
-                }
-            }
+        rows = await prisma.query_raw(
+            """
+            SELECT s.id, s.title, s.created_at,
+                   COALESCE(p.messages_text, '') AS messages_text
+            FROM   chat_sessions s
+            LEFT JOIN LATERAL (
+                SELECT string_agg(LEFT(m.content, 200), ' ' ORDER BY m.created_at) AS messages_text
+                FROM (
+                    SELECT content, created_at
+                    FROM   chat_messages
+                    WHERE  chat_session_id = s.id
+                    ORDER BY created_at ASC
+                    LIMIT  3
+                ) m
+            ) p ON true
+            WHERE  s.notebook_id = $1::uuid
+              AND  s.user_id     = $2::uuid
+            ORDER BY s.created_at DESC
+            """,
+            notebook_id,
+            user_id,
         )
-        return [
-            {
-                "id": str(s.id),
-                "title": s.title,
-                "createdAt": s.createdAt.isoformat(),
-                "created_at": s.createdAt.isoformat(),
-                "messages_text": " ".join(
-                    m.content[:200] for m in (getattr(s, "chatMessages", []) or [])[:3]
-                ),
-            }
-            for s in sessions
-        ]
+        sessions = []
+        for r in rows:
+            created = r["created_at"]
+            created_iso = created.isoformat() if isinstance(created, datetime) else str(created)
+            sessions.append({
+                "id": str(r["id"]),
+                "title": r["title"],
+                "createdAt": created_iso,
+                "created_at": created_iso,
+                "messages_text": r["messages_text"],
+            })
+        _cache_put(_sessions_cache, cache_key, sessions)
+        return sessions
     except Exception as exc:
         logger.error("get_chat_sessions failed: %s", exc)
         return []
@@ -446,6 +577,7 @@ async def create_chat_session(notebook_id: str, user_id: str, title: str = "New
         session = await prisma.chatsession.create(
             data={"notebookId": notebook_id, "userId": user_id, "title": title}
         )
+        invalidate_chat_cache(user_id, notebook_id)
         return str(session.id)
     except Exception as exc:
         logger.error("create_chat_session failed: %s", exc)
@@ -480,6 +612,9 @@ async def delete_chat_session(session_id: str, user_id: str) -> bool:
     except Exception as exc:
         logger.error("delete_chat_session failed: %s", exc)
         return False
+    finally:
+        # The session's notebook isn't known here — drop all of the user's entries
+        invalidate_chat_cache(user_id)
 
 
 # ── Block followup & suggestions ─────────────────────────────
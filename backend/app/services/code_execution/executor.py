@@ -6,6 +6,7 @@ Ties together security validation → code sanitization → sandbox execution 
 from __future__ import annotations
 
 import ast
+import asyncio
 import logging
 import uuid
 from typing import Any, Awaitable, Callable, Dict, List, Optional
@@ -147,6 +148,23 @@ async def execute_code(
     }
 
 
+def _parquet_preview(pf: Dict[str, str]) -> str:
+    """Return the prompt section describing one parquet file (blocking read)."""
+    try:
+        import pandas as pd
+        df_preview = pd.read_parquet(pf["path"]).head(5)
+        cols = list(df_preview.columns)
+        dtypes = {str(c): str(df_preview[c].dtype) for c in cols}
+        return (
+            f"- {pf['name']}\n"
+            f"  Columns: {cols}\n"
+            f"  Dtypes: {dtypes}\n"
+            f"  Sample rows:\n{df_preview.to_string(index=False, max_cols=10)}\n\n"
+        )
+    except Exception:
+        return f"- {pf['name']} (schema preview unavailable)\n\n"
+
+
 async def generate_and_execute(
     user_query: str,
     csv_files: Optional[List[Dict[str, Any]]] = None,
@@ -179,21 +197,11 @@ async def generate_and_execute(
     # Parquet files (preferred — fast pd.read_parquet)
     if parquet_files:
         data_context += "Available Parquet files in your working directory (use pd.read_parquet):\n"
-        for pf in parquet_files:
-            # Read a small preview
-            try:
-                import pandas as pd
-                df_preview = pd.read_parquet(pf["path"]).head(5)
-                cols = list(df_preview.columns)
-                dtypes = {str(c): str(df_preview[c].dtype) for c in cols}
-                data_context += (
-                    f"- {pf['name']}\n"
-                    f"  Columns: {cols}\n"
-                    f"  Dtypes: {dtypes}\n"
-                    f"  Sample rows:\n{df_preview.to_string(index=False, max_cols=10)}\n\n"
-                )
-            except Exception:
-                data_context += f"- {pf['name']} (schema preview unavailable)\n\n"
+        # Read the previews concurrently, off the event loop
+        previews = await asyncio.gather(
+            *(asyncio.to_thread(_parquet_preview, pf) for pf in parquet_files)
+        )
+        data_context += "".join(previews)
 
     # Legacy CSV text context
     if csv_files: